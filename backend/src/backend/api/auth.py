@@ -1,7 +1,8 @@
 """Authentication API routes."""
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from ..db import get_db, User
+from ..utils.responses import ojson
 from ..auth import create_session, invalidate_session, require_auth
 from ..config import Config
 
@@ -22,24 +23,32 @@ def check_password():
     password = data.get('password')
     
     if not password:
-        return jsonify({'error': 'Password is required'}), 400
+        return ojson({'error': 'Password is required'}), 400
     
     if len(password) < 8:
-        return jsonify({'error': 'Password must be at least 8 characters'}), 400
+        return ojson({'error': 'Password must be at least 8 characters'}), 400
     
     db = get_db()
-    
-    # Check all users for password match
-    users = db.query(User).all()
-    
-    for user in users:
-        if user.check_password(password): # TODO: check all users for password match, not just the first one
-            return jsonify({
+
+    # Narrow candidates with the indexed HMAC prefilter, then confirm with
+    # bcrypt. Legacy rows without an HMAC still fall back to a bcrypt check.
+    password_hmac = User.hmac_password(password)
+    candidates = db.query(User).filter(
+        (User.password_hmac == password_hmac) | (User.password_hmac.is_(None))
+    ).all()
+
+    for user in candidates:
+        if user.check_password(password):
+            # Backfill the HMAC for legacy rows so future checks are indexed
+            if user.password_hmac is None:
+                user.password_hmac = password_hmac
+                db.commit()
+            return ojson({
                 'exists': True,
                 'user_id': user.id
             }), 200
-    
-    return jsonify({'exists': False}), 200
+
+    return ojson({'exists': False}), 200
 
 
 @auth_bp.route('/login', methods=['POST'])
@@ -58,7 +67,7 @@ def login():
     password = data.get('password')
     
     if not username or not password:
-        return jsonify({'error': 'Username and password are required'}), 400
+        return ojson({'error': 'Username and password are required'}), 400
     
     db = get_db()
     
@@ -66,15 +75,15 @@ def login():
     user = db.query(User).filter_by(username=username).first()
     
     if not user or not user.check_password(password):
-        return jsonify({'error': 'Invalid username or password'}), 401
+        return ojson({'error': 'Invalid username or password'}), 401
     
     # Create session
     session = create_session(user, hours=Config.SESSION_EXPIRY_HOURS)
     
-    return jsonify({
+    return ojson({
         'session_token': session.session_token,
         'user': user.to_dict(),
-        'expires_at': session.expires_at.isoformat()
+        'expires_at': session.expires_at
     }), 200
 
 
@@ -94,20 +103,20 @@ def register():
     password = data.get('password')
     
     if not username or not password:
-        return jsonify({'error': 'Username and password are required'}), 400
+        return ojson({'error': 'Username and password are required'}), 400
     
     if len(username) < 3:
-        return jsonify({'error': 'Username must be at least 3 characters'}), 400
+        return ojson({'error': 'Username must be at least 3 characters'}), 400
     
     if len(password) < 8:
-        return jsonify({'error': 'Password must be at least 8 characters'}), 400
+        return ojson({'error': 'Password must be at least 8 characters'}), 400
     
     db = get_db()
     
     # Check if username already exists
     existing_user = db.query(User).filter_by(username=username).first()
     if existing_user:
-        return jsonify({'error': 'Username already exists'}), 400
+        return ojson({'error': 'Username already exists'}), 400
     
     # Create new user
     user = User(username=username)
@@ -120,10 +129,10 @@ def register():
     # Create session
     session = create_session(user, hours=Config.SESSION_EXPIRY_HOURS)
     
-    return jsonify({
+    return ojson({
         'session_token': session.session_token,
         'user': user.to_dict(),
-        'expires_at': session.expires_at.isoformat()
+        'expires_at': session.expires_at
     }), 201
 
 
@@ -143,7 +152,7 @@ def logout(current_user):
     if token:
         invalidate_session(token)
     
-    return jsonify({'message': 'Logged out successfully'}), 200
+    return ojson({'message': 'Logged out successfully'}), 200
 
 
 @auth_bp.route('/me', methods=['GET'])
@@ -156,5 +165,5 @@ def get_current_user(current_user):
     Returns:
         User object
     """
-    return jsonify(current_user.to_dict()), 200
+    return ojson(current_user.to_dict()), 200
 
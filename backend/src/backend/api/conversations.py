@@ -1,9 +1,13 @@
 """Conversation management API routes."""
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from datetime import datetime
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
 from ..db import get_db, Conversation, Message, ConversationDocument, Document
 from ..auth import require_auth
+from ..utils.responses import ojson
 
 conversations_bp = Blueprint('conversations', __name__)
 
@@ -11,17 +15,73 @@ conversations_bp = Blueprint('conversations', __name__)
 @conversations_bp.route('', methods=['GET'])
 @require_auth
 def list_conversations(current_user):
-    """List all conversations for the current user.
-    
+    """List conversations for the current user, newest first.
+
     Requires Authorization header with Bearer token.
-    
+
+    Query params:
+        limit: Maximum number of conversations to return (default: 50)
+        before: ISO timestamp; only conversations updated before it are returned
+        before_id: id of the last row of the previous page; disambiguates
+            rows sharing the boundary timestamp
+
     Returns:
         List of conversation objects
     """
+    limit = request.args.get('limit', 50, type=int)
+    before = request.args.get('before')
+    before_id = request.args.get('before_id', type=int)
+
     db = get_db()
-    conversations = db.query(Conversation).filter_by(user_id=current_user.id).order_by(Conversation.updated_at.desc()).all()
-    
-    return jsonify([conv.to_dict() for conv in conversations]), 200
+
+    # Column-level select with an aggregated message count: no ORM object
+    # hydration and no per-row lazy load of the messages collection
+    query = db.query(
+        Conversation.id,
+        Conversation.user_id,
+        Conversation.title,
+        Conversation.created_at,
+        Conversation.updated_at,
+        func.count(Message.id).label('message_count')
+    ).outerjoin(
+        Message, Message.conversation_id == Conversation.id
+    ).filter(
+        Conversation.user_id == current_user.id
+    ).group_by(Conversation.id)
+
+    # Keyset pagination on (updated_at, id) instead of OFFSET scans.
+    # CURRENT_TIMESTAMP has one-second resolution, so several rows can
+    # share the boundary timestamp; the composite cursor keeps ties at
+    # a page edge from being skipped. A timestamp-only cursor still
+    # works for callers that don't send before_id.
+    if before:
+        try:
+            before_ts = datetime.fromisoformat(before)
+        except ValueError:
+            return ojson({'error': 'Invalid before timestamp'}), 400
+        if before_id is not None:
+            query = query.filter(
+                tuple_(Conversation.updated_at, Conversation.id) < (before_ts, before_id)
+            )
+        else:
+            query = query.filter(Conversation.updated_at < before_ts)
+
+    rows = query.order_by(
+        Conversation.updated_at.desc(),
+        Conversation.id.desc()
+    ).limit(limit).all()
+
+    return ojson([
+        {
+            'id': row.id,
+            'user_id': row.user_id,
+            'title': row.title,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at,
+            'message_count': row.message_count
+        }
+        for row in rows
+    ]), 200
 
 
 @conversations_bp.route('', methods=['POST'])
@@ -51,7 +111,7 @@ def create_conversation(current_user):
     db.commit()
     db.refresh(conversation)
     
-    return jsonify(conversation.to_dict()), 201
+    return ojson(conversation.to_dict()), 201
 
 
 @conversations_bp.route('/<int:conv_id>', methods=['GET'])
@@ -68,12 +128,18 @@ def get_conversation(current_user, conv_id):
         Conversation object with messages
     """
     db = get_db()
-    conversation = db.query(Conversation).filter_by(id=conv_id, user_id=current_user.id).first()
-    
-    if not conversation:
-        return jsonify({'error': 'Conversation not found'}), 404
-    
-    return jsonify(conversation.to_dict(include_messages=True, include_documents=True)), 200
+    # Eager-load messages and attached documents in one extra query each,
+    # instead of one lazy load per message/document during serialization
+    conversation = db.get(Conversation, conv_id, options=[
+        selectinload(Conversation.messages),
+        selectinload(Conversation.conversation_documents)
+        .selectinload(ConversationDocument.document)
+    ])
+
+    if conversation is None or conversation.user_id != current_user.id:
+        return ojson({'error': 'Conversation not found'}), 404
+
+    return ojson(conversation.to_dict(include_messages=True, include_documents=True)), 200
 
 
 @conversations_bp.route('/<int:conv_id>', methods=['PUT'])
@@ -95,13 +161,14 @@ def update_conversation(current_user, conv_id):
     data = request.get_json()
     
     if not data or 'title' not in data:
-        return jsonify({'error': 'Title is required'}), 400
+        return ojson({'error': 'Title is required'}), 400
     
     db = get_db()
-    conversation = db.query(Conversation).filter_by(id=conv_id, user_id=current_user.id).first()
-    
-    if not conversation:
-        return jsonify({'error': 'Conversation not found'}), 404
+    # PK lookup hits the session identity map before touching the DB
+    conversation = db.get(Conversation, conv_id)
+
+    if conversation is None or conversation.user_id != current_user.id:
+        return ojson({'error': 'Conversation not found'}), 404
     
     conversation.title = data['title']
     conversation.updated_at = datetime.utcnow()
@@ -109,7 +176,7 @@ def update_conversation(current_user, conv_id):
     db.commit()
     db.refresh(conversation)
     
-    return jsonify(conversation.to_dict()), 200
+    return ojson(conversation.to_dict()), 200
 
 
 @conversations_bp.route('/<int:conv_id>', methods=['DELETE'])
@@ -126,15 +193,21 @@ def delete_conversation(current_user, conv_id):
         {message: 'Conversation deleted'}
     """
     db = get_db()
-    conversation = db.query(Conversation).filter_by(id=conv_id, user_id=current_user.id).first()
-    
-    if not conversation:
-        return jsonify({'error': 'Conversation not found'}), 404
-    
-    db.delete(conversation)
+
+    # Lightweight ownership probe instead of loading the full object
+    owned = db.query(Conversation.id).filter_by(id=conv_id, user_id=current_user.id).scalar()
+
+    if not owned:
+        return ojson({'error': 'Conversation not found'}), 404
+
+    # Bulk statements delete the whole conversation in three DELETEs
+    # instead of loading and cascading row by row through the ORM
+    db.execute(delete(Message).where(Message.conversation_id == conv_id))
+    db.execute(delete(ConversationDocument).where(ConversationDocument.conversation_id == conv_id))
+    db.execute(delete(Conversation).where(Conversation.id == conv_id))
     db.commit()
-    
-    return jsonify({'message': 'Conversation deleted'}), 200
+
+    return ojson({'message': 'Conversation deleted'}), 200
 
 
 @conversations_bp.route('/<int:conv_id>/documents', methods=['POST'])
@@ -157,42 +230,45 @@ def attach_document(current_user, conv_id):
     document_id = data.get('document_id')
     
     if not document_id:
-        return jsonify({'error': 'document_id is required'}), 400
+        return ojson({'error': 'document_id is required'}), 400
     
     db = get_db()
-    
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter_by(id=conv_id, user_id=current_user.id).first()
-    if not conversation:
-        return jsonify({'error': 'Conversation not found'}), 404
-    
-    # Verify document belongs to user
-    document = db.query(Document).filter_by(id=document_id, user_id=current_user.id).first()
-    if not document:
-        return jsonify({'error': 'Document not found'}), 404
-    
-    # Check if already attached
-    existing = db.query(ConversationDocument).filter_by(
-        conversation_id=conv_id,
-        document_id=document_id
-    ).first()
-    
-    if existing:
-        return jsonify({'error': 'Document already attached to this conversation'}), 400
-    
-    # Create attachment
-    attachment = ConversationDocument(
-        conversation_id=conv_id,
-        document_id=document_id
+
+    # Verify conversation ownership with a scalar EXISTS probe
+    conv_owned = db.query(
+        db.query(Conversation.id).filter_by(id=conv_id, user_id=current_user.id).exists()
+    ).scalar()
+    if not conv_owned:
+        return ojson({'error': 'Conversation not found'}), 404
+
+    # Verify document belongs to user via a PK lookup
+    document = db.get(Document, document_id)
+    if document is None or document.user_id != current_user.id:
+        return ojson({'error': 'Document not found'}), 404
+
+    # INSERT OR IGNORE lets the unique constraint reject duplicates in the
+    # same round trip instead of a check-then-insert race
+    attached_at = datetime.utcnow()
+    result = db.execute(
+        sqlite_insert(ConversationDocument)
+        .values(conversation_id=conv_id, document_id=document_id, attached_at=attached_at)
+        .on_conflict_do_nothing()
     )
-    
-    db.add(attachment)
+
+    if result.rowcount == 0:
+        db.rollback()
+        return ojson({'error': 'Document already attached to this conversation'}), 400
+
     db.commit()
-    db.refresh(attachment)
-    
-    return jsonify({
+
+    return ojson({
         'message': 'Document attached successfully',
-        'attachment': attachment.to_dict(),
+        'attachment': {
+            'id': result.inserted_primary_key[0],
+            'conversation_id': conv_id,
+            'document_id': document_id,
+            'attached_at': attached_at
+        },
         'document': document.to_dict()
     }), 201
 
@@ -212,23 +288,27 @@ def detach_document(current_user, conv_id, doc_id):
         Success message
     """
     db = get_db()
-    
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter_by(id=conv_id, user_id=current_user.id).first()
-    if not conversation:
-        return jsonify({'error': 'Conversation not found'}), 404
-    
-    # Find attachment
-    attachment = db.query(ConversationDocument).filter_by(
-        conversation_id=conv_id,
-        document_id=doc_id
-    ).first()
-    
-    if not attachment:
-        return jsonify({'error': 'Document not attached to this conversation'}), 404
-    
-    db.delete(attachment)
+
+    # Verify conversation ownership with a scalar EXISTS probe
+    conv_owned = db.query(
+        db.query(Conversation.id).filter_by(id=conv_id, user_id=current_user.id).exists()
+    ).scalar()
+    if not conv_owned:
+        return ojson({'error': 'Conversation not found'}), 404
+
+    # Delete and detect "not attached" from the rowcount in one round trip
+    result = db.execute(
+        delete(ConversationDocument).where(
+            ConversationDocument.conversation_id == conv_id,
+            ConversationDocument.document_id == doc_id
+        )
+    )
+
+    if result.rowcount == 0:
+        db.rollback()
+        return ojson({'error': 'Document not attached to this conversation'}), 404
+
     db.commit()
-    
-    return jsonify({'message': 'Document detached successfully'}), 200
+
+    return ojson({'message': 'Document detached successfully'}), 200
 
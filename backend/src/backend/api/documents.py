@@ -1,10 +1,16 @@
 """Document management API routes."""
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, send_file, Response
 from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from sqlalchemy import tuple_
+from ..config import Config
 from ..db import get_db, Document
 from ..auth import require_auth
+from ..utils.responses import ojson
+from .websocket import rag_cache, set_user_has_documents
 from ..storage import save_file, delete_file
 from ..store import (
     process_pdf_to_chunks,
@@ -16,6 +22,10 @@ from ..store import (
 
 documents_bp = Blueprint('documents', __name__)
 
+# Chunks embedded per batch during ingestion. Batching lets the embedding
+# of one batch overlap the Chroma write of the previous one.
+INGEST_BATCH_SIZE = 256
+
 
 @documents_bp.route('/upload', methods=['POST'])
 @require_auth
@@ -30,12 +40,12 @@ def upload_document(current_user):
         Document object with id, filename, etc.
     """
     if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+        return ojson({'error': 'No file provided'}), 400
     
     file = request.files['file']
     
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return ojson({'error': 'No file selected'}), 400
     
     db = get_db()
     
@@ -49,65 +59,149 @@ def upload_document(current_user):
     db.add(document)
     db.flush()  # Get the document ID without committing
     
-    # Save file to disk
-    file_path, original_filename = save_file(file, current_user.id, document.id)
-    
+    # Save file to disk, hashing the content as it streams
+    file_path, original_filename, content_hash = save_file(file, current_user.id, document.id)
+
     if not file_path:
         db.rollback()
-        return jsonify({'error': 'Failed to save file'}), 500
-    
+        return ojson({'error': 'Failed to save file'}), 500
+
+    # An identical PDF already processed for this user skips the whole
+    # chunking/embedding pipeline; return the existing document instead
+    existing = db.query(Document).filter(
+        Document.user_id == current_user.id,
+        Document.content_hash == content_hash,
+        Document.id != document.id
+    ).first()
+
+    if existing:
+        db.rollback()
+        delete_file(file_path)
+        return ojson(existing.to_dict()), 200
+
     # Update document with file info
     document.filename = original_filename
     document.file_path = file_path
-    
+    document.content_hash = content_hash
+
     # Create ChromaDB collection
     collection_name = f"doc_{current_user.id}_{document.id}"
     document.chroma_collection_id = collection_name
     
     try:
-        # Process PDF to chunks
+        # Process PDF into parallel chunk arrays
         chunks = process_pdf_to_chunks(file_path)
-        
-        if not chunks:
+        texts = chunks['texts']
+        page_numbers = chunks['page_numbers']
+
+        if not texts:
             db.rollback()
             delete_file(file_path)
-            return jsonify({'error': 'Failed to extract text from PDF'}), 500
-        
-        # Generate embeddings
-        texts = [chunk['text'] for chunk in chunks]
-        embeddings = generate_embeddings(texts)
-        
-        # Create collection and add documents
+            return ojson({'error': 'Failed to extract text from PDF'}), 500
+
         collection = create_collection(collection_name)
-        add_documents_to_collection(collection, chunks, embeddings, document.id)
-        
+
+        # Pipeline embedding and vector writes: while one batch is written
+        # to Chroma on the writer thread, the next batch is being embedded,
+        # so the CPU-bound and I/O-bound halves of ingestion overlap
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+
+            for start in range(0, len(texts), INGEST_BATCH_SIZE):
+                end = start + INGEST_BATCH_SIZE
+                embeddings = generate_embeddings(texts[start:end])
+
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(
+                    add_documents_to_collection, collection,
+                    texts[start:end], page_numbers[start:end], start,
+                    embeddings, document.id
+                )
+
+            if pending is not None:
+                pending.result()
+
         # Commit the document
         db.commit()
         db.refresh(document)
+
+        # Let this user's live websocket connections know RAG can apply,
+        # and drop any retrieval results cached before this document
+        set_user_has_documents(current_user.id, True)
+        rag_cache.invalidate_user(current_user.id)
         
-        return jsonify(document.to_dict()), 201
+        return ojson(document.to_dict()), 201
         
     except Exception as e:
         db.rollback()
         delete_file(file_path)
         delete_collection(collection_name)
-        return jsonify({'error': f'Failed to process document: {str(e)}'}), 500
+        return ojson({'error': f'Failed to process document: {str(e)}'}), 500
 
 
 @documents_bp.route('', methods=['GET'])
 @require_auth
 def list_documents(current_user):
-    """List all documents for the current user.
-    
+    """List documents for the current user, newest first.
+
     Requires Authorization header with Bearer token.
-    
+
+    Query params:
+        limit: Maximum number of documents to return (default: 50)
+        before: ISO timestamp; only documents uploaded before it are returned
+        before_id: id of the last row of the previous page; disambiguates
+            rows sharing the boundary timestamp
+
     Returns:
         List of document objects
     """
+    limit = request.args.get('limit', 50, type=int)
+    before = request.args.get('before')
+    before_id = request.args.get('before_id', type=int)
+
     db = get_db()
-    documents = db.query(Document).filter_by(user_id=current_user.id).order_by(Document.uploaded_at.desc()).all()
-    
-    return jsonify([doc.to_dict() for doc in documents]), 200
+
+    # Column-level select, keyset-paginated on (uploaded_at, id)
+    query = db.query(
+        Document.id,
+        Document.user_id,
+        Document.filename,
+        Document.chroma_collection_id,
+        Document.uploaded_at
+    ).filter(Document.user_id == current_user.id)
+
+    # uploaded_at has one-second resolution, so several rows can share
+    # the boundary timestamp; the composite cursor keeps ties at a page
+    # edge from being skipped. A timestamp-only cursor still works for
+    # callers that don't send before_id.
+    if before:
+        try:
+            before_ts = datetime.fromisoformat(before)
+        except ValueError:
+            return ojson({'error': 'Invalid before timestamp'}), 400
+        if before_id is not None:
+            query = query.filter(
+                tuple_(Document.uploaded_at, Document.id) < (before_ts, before_id)
+            )
+        else:
+            query = query.filter(Document.uploaded_at < before_ts)
+
+    rows = query.order_by(
+        Document.uploaded_at.desc(),
+        Document.id.desc()
+    ).limit(limit).all()
+
+    return ojson([
+        {
+            'id': row.id,
+            'user_id': row.user_id,
+            'filename': row.filename,
+            'chroma_collection_id': row.chroma_collection_id,
+            'uploaded_at': row.uploaded_at
+        }
+        for row in rows
+    ]), 200
 
 
 @documents_bp.route('/<int:doc_id>', methods=['GET'])
@@ -127,9 +221,9 @@ def get_document(current_user, doc_id):
     document = db.query(Document).filter_by(id=doc_id, user_id=current_user.id).first()
     
     if not document:
-        return jsonify({'error': 'Document not found'}), 404
+        return ojson({'error': 'Document not found'}), 404
     
-    return jsonify(document.to_dict()), 200
+    return ojson(document.to_dict()), 200
 
 
 @documents_bp.route('/<int:doc_id>', methods=['DELETE'])
@@ -149,7 +243,7 @@ def delete_document(current_user, doc_id):
     document = db.query(Document).filter_by(id=doc_id, user_id=current_user.id).first()
     
     if not document:
-        return jsonify({'error': 'Document not found'}), 404
+        return ojson({'error': 'Document not found'}), 404
     
     # Delete file from disk
     delete_file(document.file_path)
@@ -160,8 +254,15 @@ def delete_document(current_user, doc_id):
     # Delete document record
     db.delete(document)
     db.commit()
+
+    # Refresh the cached RAG gate on live websocket connections
+    still_has = db.query(
+        db.query(Document.id).filter_by(user_id=current_user.id).exists()
+    ).scalar()
+    set_user_has_documents(current_user.id, still_has)
+    rag_cache.invalidate_user(current_user.id)
     
-    return jsonify({'message': 'Document deleted'}), 200
+    return ojson({'message': 'Document deleted'}), 200
 
 
 @documents_bp.route('/<int:doc_id>/view', methods=['GET'])
@@ -181,13 +282,22 @@ def view_document(current_user, doc_id):
     document = db.query(Document).filter_by(id=doc_id, user_id=current_user.id).first()
     
     if not document:
-        return jsonify({'error': 'Document not found'}), 404
+        return ojson({'error': 'Document not found'}), 404
     
     file_path = Path(document.file_path)
     
     if not file_path.exists():
-        return jsonify({'error': 'File not found on disk'}), 404
-    
+        return ojson({'error': 'File not found on disk'}), 404
+
+    # Delegate the transfer to the front proxy when configured: the
+    # worker returns immediately and nginx sends the file zero-copy
+    if Config.ACCEL_REDIRECT_PREFIX:
+        relative = file_path.relative_to(Config.UPLOADS_PATH)
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = f"{Config.ACCEL_REDIRECT_PREFIX}/{relative}"
+        response.headers['Content-Disposition'] = f'inline; filename="{document.filename}"'
+        return response
+
     return send_file(
         str(file_path),
         mimetype='application/pdf',
@@ -1,15 +1,34 @@
 """Settings API routes for user preferences and API keys."""
 
-from flask import Blueprint, request, jsonify
+import threading
+import time
+
+from flask import Blueprint, request
 from datetime import datetime
 from ..db import get_db, ApiKey
 from ..auth import require_auth
 from ..utils.encryption import encrypt_api_key, decrypt_api_key
+from ..utils.responses import ojson
 
 settings_bp = Blueprint('settings', __name__)
 
 VALID_PROVIDERS = ['openai', 'anthropic', 'google', 'grok']
 
+# Decrypted API keys cached per (user_id, provider). Every chat turn needs
+# the key, and without the cache each turn pays a SQL round trip plus a
+# Fernet decryption. Entries expire after a short TTL and are evicted
+# whenever the key is saved or deleted.
+_API_KEY_CACHE_TTL = 300
+_API_KEY_CACHE_MAX = 1024
+_api_key_cache = {}
+_api_key_cache_lock = threading.Lock()
+
+
+def _invalidate_cached_api_key(user_id, provider):
+    """Drop the cached decrypted key for a (user, provider) pair."""
+    with _api_key_cache_lock:
+        _api_key_cache.pop((user_id, provider), None)
+
 
 @settings_bp.route('/api-keys', methods=['GET'])
 @require_auth
@@ -23,19 +42,20 @@ def get_api_keys(current_user):
     """
     db = get_db()
     api_keys = db.query(ApiKey).filter_by(user_id=current_user.id).all()
-    
-    # Return providers with status
-    configured_providers = {key.provider for key in api_keys}
-    
+
+    # One dict pass instead of re-scanning the key list per provider
+    keys_by_provider = {key.provider: key for key in api_keys}
+
     result = []
     for provider in VALID_PROVIDERS:
+        key = keys_by_provider.get(provider)
         result.append({
             'provider': provider,
-            'configured': provider in configured_providers,
-            'updated_at': next((key.updated_at.isoformat() for key in api_keys if key.provider == provider), None)
+            'configured': key is not None,
+            'updated_at': key.updated_at if key else None
         })
-    
-    return jsonify(result), 200
+
+    return ojson(result), 200
 
 
 @settings_bp.route('/api-keys', methods=['POST'])
@@ -57,10 +77,10 @@ def save_api_key(current_user):
     api_key = data.get('api_key', '')
     
     if not provider or provider not in VALID_PROVIDERS:
-        return jsonify({'error': f'Invalid provider. Must be one of: {", ".join(VALID_PROVIDERS)}'}), 400
+        return ojson({'error': f'Invalid provider. Must be one of: {", ".join(VALID_PROVIDERS)}'}), 400
     
     if not api_key:
-        return jsonify({'error': 'API key is required'}), 400
+        return ojson({'error': 'API key is required'}), 400
     
     db = get_db()
     
@@ -89,8 +109,9 @@ def save_api_key(current_user):
         message = f'API key for {provider} added successfully'
     
     db.commit()
-    
-    return jsonify({'message': message}), 200
+    _invalidate_cached_api_key(current_user.id, provider)
+
+    return ojson({'message': message}), 200
 
 
 @settings_bp.route('/api-keys/<provider>', methods=['DELETE'])
@@ -109,7 +130,7 @@ def delete_api_key(current_user, provider):
     provider = provider.lower()
     
     if provider not in VALID_PROVIDERS:
-        return jsonify({'error': f'Invalid provider. Must be one of: {", ".join(VALID_PROVIDERS)}'}), 400
+        return ojson({'error': f'Invalid provider. Must be one of: {", ".join(VALID_PROVIDERS)}'}), 400
     
     db = get_db()
     
@@ -119,12 +140,13 @@ def delete_api_key(current_user, provider):
     ).first()
     
     if not api_key:
-        return jsonify({'error': f'No API key found for {provider}'}), 404
+        return ojson({'error': f'No API key found for {provider}'}), 404
     
     db.delete(api_key)
     db.commit()
-    
-    return jsonify({'message': f'API key for {provider} deleted successfully'}), 200
+    _invalidate_cached_api_key(current_user.id, provider)
+
+    return ojson({'message': f'API key for {provider} deleted successfully'}), 200
 
 
 def get_user_api_key(user_id, provider):
@@ -137,15 +159,33 @@ def get_user_api_key(user_id, provider):
     Returns:
         Decrypted API key or None if not found
     """
+    cache_key = (user_id, provider)
+
+    with _api_key_cache_lock:
+        cached = _api_key_cache.get(cache_key)
+        if cached is not None:
+            decrypted, expires_at = cached
+            if time.monotonic() < expires_at:
+                return decrypted
+            del _api_key_cache[cache_key]
+
     db = get_db()
-    
+
     api_key = db.query(ApiKey).filter_by(
         user_id=user_id,
         provider=provider
     ).first()
-    
+
     if not api_key:
         return None
-    
-    return decrypt_api_key(api_key.encrypted_key)
+
+    decrypted = decrypt_api_key(api_key.encrypted_key)
+
+    with _api_key_cache_lock:
+        # Evict the oldest entry rather than growing without bound
+        if len(_api_key_cache) >= _API_KEY_CACHE_MAX:
+            _api_key_cache.pop(next(iter(_api_key_cache)))
+        _api_key_cache[cache_key] = (decrypted, time.monotonic() + _API_KEY_CACHE_TTL)
+
+    return decrypted
 
@@ -1,20 +1,205 @@
 """WebSocket event handlers for real-time chat."""
 
+import re
+import time
+
 from flask import request
-from flask_socketio import emit, disconnect
-from datetime import datetime
+from flask_socketio import emit, disconnect, join_room
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import exists, func, insert, select, text
 from ..app import socketio
 from ..auth import get_user_by_session_token
-from ..db import get_db, Conversation, Message, Document
-from ..store import search_multiple_documents, get_context_from_results
+from ..db import get_db, new_session, Conversation, Message, Document
+from ..store import search_multiple_documents, get_context_from_results, warm_collections
 from ..utils import get_provider_from_model
-from ..utils.llm_providers import get_provider
+from ..utils.llm_providers import get_provider_for_key
+from ..utils.query_cache import QueryCache
 from .settings import get_user_api_key
 
-# Store connected users
+# Connected clients keyed by sid: user id, a session held for the lifetime
+# of the connection (so events don't check one out each time), and a cached
+# has-documents flag that gates RAG without a per-message probe
 connected_users = {}
 
 
+# Streamed tokens are coalesced into at most ~4KB or 25ms buckets; a
+# socketio frame per provider token costs more in framing and JSON
+# encoding than the token itself
+STREAM_FLUSH_BYTES = 4096
+STREAM_FLUSH_SECS = 0.025
+
+# Upper bound on a single chat message; bounds the DB write and keeps
+# embedding/search time on pathological inputs predictable
+MAX_MESSAGE_LEN = 32 * 1024
+
+# Seconds between sweeps for connections whose disconnect event was lost
+_SWEEP_INTERVAL = 60
+_sweeper_started = False
+
+
+def _sweep_stale_connections():
+    """Periodically evict entries whose socket is no longer connected.
+
+    Disconnect events can be dropped on abrupt network aborts; without the
+    sweep those entries would linger forever and leak their pooled DB
+    connection now that each connection holds a session.
+    """
+    while True:
+        socketio.sleep(_SWEEP_INTERVAL)
+        try:
+            live_sids = set(socketio.server.manager.rooms.get('/', {}))
+        except Exception:
+            continue
+
+        for sid in list(connected_users):
+            if sid not in live_sids:
+                entry = connected_users.pop(sid, None)
+                if entry:
+                    entry['session'].close()
+                    print(f"Swept stale connection for user {entry['user_id']}")
+
+
+def set_user_has_documents(user_id, has_docs):
+    """Update the cached has-documents flag on a user's connections.
+
+    Called by the documents API after uploads and deletes so connected
+    clients don't re-probe the documents table on every chat message.
+
+    Args:
+        user_id: User whose flag changed
+        has_docs: Whether the user now has any documents
+    """
+    for entry in connected_users.values():
+        if entry['user_id'] == user_id:
+            entry['has_docs'] = has_docs
+
+# Static prompt scaffolding, built once at import. The system prompts are
+# byte-identical across turns so providers with prefix-based prompt
+# caching reuse them; retrieved context travels as its own user turn.
+SYSTEM_PROMPT_BASE = "You are a helpful assistant."
+SYSTEM_PROMPT_RAG = (
+    "You are a helpful assistant. Use the retrieved context from the user's documents, "
+    "provided in <retrieved_context> blocks, to answer their questions. If the context "
+    "doesn't contain relevant information, you can use your general knowledge."
+)
+# Wrapper for the per-turn context message, joined around the retrieved
+# text so only one string the size of the context is allocated per turn
+_CTX_PREFIX = '<retrieved_context>\n'
+_CTX_SUFFIX = '\n</retrieved_context>'
+
+# Worker pool for RAG retrieval so Chroma searches don't block the
+# socketio handler while it persists and acknowledges the user message
+_rag_executor = ThreadPoolExecutor(max_workers=4)
+
+# Retrieval results cached per (user, attached docs, normalized query);
+# retried and repeated questions skip the embedding + ANN search entirely.
+# The documents API invalidates a user's entries on upload/delete.
+rag_cache = QueryCache(max_size=2000, ttl_seconds=300)
+
+
+# FTS pre-filter bounds. The probe only runs when more than one document
+# is attached — with a single document there is nothing to narrow — and
+# its result is used whenever it excludes at least one document.
+_FTS_MAX_TOKENS = 16
+_FTS_TOKEN_RE = re.compile(r'\w+')
+
+
+def _fts_candidate_doc_ids(db, doc_ids, query):
+    """Narrow the attached documents with a full-text filename match.
+
+    A keyword-like query often names the document it is about; an FTS5
+    probe costs a few milliseconds versus an ANN search per collection.
+    Falls back to the full set when the index is absent, the query has
+    no usable tokens, or the match doesn't actually narrow anything.
+
+    Args:
+        db: Session to query with
+        doc_ids: Document IDs attached to the conversation
+        query: User message text
+
+    Returns:
+        List of document IDs to vector-search
+    """
+    # One attached document can't be narrowed; skip the probe entirely
+    if len(doc_ids) <= 1:
+        return doc_ids
+
+    tokens = _FTS_TOKEN_RE.findall(query)[:_FTS_MAX_TOKENS]
+    if not tokens:
+        return doc_ids
+
+    match = ' OR '.join(f'"{token}"' for token in tokens)
+    try:
+        rows = db.execute(
+            text("SELECT rowid FROM documents_fts WHERE documents_fts MATCH :q LIMIT 20"),
+            {'q': match}
+        ).scalars().all()
+    except Exception:
+        # Index not migrated yet, or the query broke FTS syntax anyway
+        return doc_ids
+
+    matched = set(rows)
+    hits = [doc_id for doc_id in doc_ids if doc_id in matched]
+    # Use the filter whenever it excludes something; an empty hit list
+    # means the filenames just don't reflect the query, not that no
+    # document is relevant
+    if 0 < len(hits) < len(doc_ids):
+        return hits
+    return doc_ids
+
+
+def _build_rag_context(user_id, doc_ids, query):
+    """Search the attached documents and format the prompt context.
+
+    Runs on a worker thread with its own thread-local session.
+
+    Args:
+        user_id: User ID the documents must belong to
+        doc_ids: Document IDs attached to the conversation
+        query: User message to search with
+
+    Returns:
+        Context string, empty if nothing relevant was found
+    """
+    cache_key = QueryCache.make_key(user_id, query, f"ctx|{sorted(doc_ids)}")
+    cached = rag_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    db = get_db()
+    try:
+        # Cheap FTS pre-filter: on confident keyword matches only the
+        # matching documents' collections get the ANN search
+        candidate_ids = _fts_candidate_doc_ids(db, doc_ids, query)
+
+        documents = db.execute(
+            select(Document).where(
+                Document.id.in_(candidate_ids),
+                Document.user_id == user_id
+            )
+        ).scalars().all()
+
+        if not documents:
+            return ""
+
+        collection_names = [doc.chroma_collection_id for doc in documents]
+
+        # doc_ids restricts consolidated per-user collections to the
+        # attached documents; search over-fetches under the filter
+        search_results = search_multiple_documents(
+            collection_names,
+            query,
+            n_results_per_doc=5,
+            doc_ids=[doc.id for doc in documents]
+        )
+
+        context = get_context_from_results(search_results, max_chunks=10)
+        rag_cache.put(cache_key, user_id, context)
+        return context
+    finally:
+        db.close()
+
+
 @socketio.on('connect')
 def handle_connect():
     """Handle WebSocket connection with authentication."""
@@ -39,9 +224,39 @@ def handle_connect():
         disconnect()
         return False
     
-    # Store user connection
-    connected_users[request.sid] = user.id
-    
+    # Start the stale-connection sweeper with the first client
+    global _sweeper_started
+    if not _sweeper_started:
+        _sweeper_started = True
+        socketio.start_background_task(_sweep_stale_connections)
+
+    # Store user connection with a connection-scoped DB session and a
+    # one-time probe for whether RAG can apply at all
+    session = new_session()
+    has_docs = session.execute(
+        select(exists().where(Document.user_id == user.id))
+    ).scalar()
+    connected_users[request.sid] = {
+        'user_id': user.id,
+        'session': session,
+        'has_docs': has_docs
+    }
+
+    # Page the user's collections into memory in the background so their
+    # first RAG search doesn't pay the cold index load
+    if has_docs:
+        collection_names = session.execute(
+            select(Document.chroma_collection_id)
+            .where(Document.user_id == user.id)
+            .distinct()
+        ).scalars().all()
+        warm_collections(collection_names)
+
+    # Per-user room: broadcasts to a user's connections go through
+    # socketio's room index instead of scanning connected_users
+    join_room(f'user:{user.id}')
+
+
     print(f"User {user.username} connected via WebSocket")
     emit('connected', {'message': 'Connected successfully', 'user_id': user.id})
     
@@ -51,9 +266,10 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection."""
-    user_id = connected_users.pop(request.sid, None)
-    if user_id:
-        print(f"User {user_id} disconnected from WebSocket")
+    entry = connected_users.pop(request.sid, None)
+    if entry:
+        entry['session'].close()
+        print(f"User {entry['user_id']} disconnected from WebSocket")
 
 
 @socketio.on('chat_message')
@@ -67,10 +283,11 @@ def handle_chat_message(data):
         selected_doc_ids: List of document IDs to use for RAG (optional)
     """
     # Get user
-    user_id = connected_users.get(request.sid)
-    if not user_id:
+    entry = connected_users.get(request.sid)
+    if not entry:
         emit('error', {'message': 'Not authenticated'})
         return
+    user_id = entry['user_id']
     
     # Extract data
     conversation_id = data.get('conversation_id')
@@ -80,161 +297,233 @@ def handle_chat_message(data):
     if not conversation_id or not user_message:
         emit('error', {'message': 'conversation_id and message are required'})
         return
-    
-    db = get_db()
-    
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter_by(id=conversation_id, user_id=user_id).first()
-    
+
+    if len(user_message) > MAX_MESSAGE_LEN:
+        emit('error', {'message': 'Message too long'})
+        return
+
+    # Cheap validation first: resolve the provider and API key before any
+    # conversation query or insert, so a bad model / missing key costs no
+    # DB work and nothing needs rolling back
+    provider_name = get_provider_from_model(model)
+    api_key = get_user_api_key(user_id, provider_name)
+
+    if not api_key:
+        emit('error', {
+            'message': f'No API key configured for {provider_name}. Please add your API key in settings.'
+        })
+        return
+
+    # Reuse the connection-scoped session instead of checking one out
+    db = entry['session']
+
+    # Verify conversation belongs to user (2.0-style select hits the
+    # compiled-statement cache on this per-message path)
+    conversation = db.execute(
+        select(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
+        )
+    ).scalar_one_or_none()
+
     if not conversation:
         emit('error', {'message': 'Conversation not found'})
         return
-    
+
     try:
-        # Get user's API key for the selected model
-        provider_name = get_provider_from_model(model)
-        api_key = get_user_api_key(user_id, provider_name)
-        
-        if not api_key:
-            emit('error', {
-                'message': f'No API key configured for {provider_name}. Please add your API key in settings.'
-            })
-            return
-        
-        # Save user message to database
-        user_msg = Message(
-            conversation_id=conversation_id,
-            role='user',
-            content=user_message,
-            timestamp=datetime.utcnow()
-        )
-        db.add(user_msg)
-        db.commit()
-        db.refresh(user_msg)
-        
-        # Emit acknowledgment
-        emit('message_saved', {'message_id': user_msg.id})
-        
-        # Get attached documents from conversation
-        attached_doc_ids = [cd.document_id for cd in conversation.conversation_documents]
-        
-        # Perform RAG if documents are attached
-        context = ""
+        # Kick RAG retrieval off on a worker thread so the Chroma search
+        # overlaps the user-message commit and acknowledgment below. The
+        # cached flag skips even the attachment lookup for doc-less users.
+        attached_doc_ids = []
+        if entry.get('has_docs', True):
+            attached_doc_ids = [cd.document_id for cd in conversation.conversation_documents]
+        context_future = None
         if attached_doc_ids:
-            # Get collection names for attached documents
-            documents = db.query(Document).filter(
-                Document.id.in_(attached_doc_ids),
-                Document.user_id == user_id
-            ).all()
-            
-            if documents:
-                collection_names = [doc.chroma_collection_id for doc in documents]
-                
-                # Search for relevant chunks
-                search_results = search_multiple_documents(
-                    collection_names,
-                    user_message,
-                    n_results_per_doc=5
-                )
-                
-                # Build context from results
-                context = get_context_from_results(search_results, max_chunks=10)
-        
+            context_future = _rag_executor.submit(
+                _build_rag_context, user_id, attached_doc_ids, user_message
+            )
+
+        # Save user message to database. RETURNING hands back the id in
+        # the same round trip, and the timestamp is generated server-side.
+        user_msg_id = db.execute(
+            insert(Message).values(
+                conversation_id=conversation_id,
+                role='user',
+                content=user_message
+            ).returning(Message.id)
+        ).scalar_one()
+
+        # Emit acknowledgment
+        emit('message_saved', {'message_id': user_msg_id})
+
+        # Make the user message durable, then hand the slow half of the
+        # turn (retrieval wait + LLM stream) to a background task so this
+        # event thread is free for other clients during the 5-30s stream
+        db.commit()
+
+        socketio.start_background_task(
+            _stream_response,
+            request.sid,
+            conversation_id,
+            user_message,
+            user_msg_id,
+            model,
+            provider_name,
+            api_key,
+            context_future
+        )
+
+    except Exception as e:
+        print(f"Error handling chat message: {e}")
+        import traceback
+        traceback.print_exc()
+        emit('error', {'message': f'Error processing message: {str(e)}'})
+        db.rollback()
+
+
+def _stream_response(sid, conversation_id, user_message, user_msg_id, model,
+                     provider_name, api_key, context_future):
+    """Build the prompt, stream the LLM response and persist the reply.
+
+    Runs as a background task with its own session; emits are addressed
+    to the originating sid.
+
+    Args:
+        sid: Socket id of the requesting client
+        conversation_id: Conversation being answered
+        user_message: The user's message text
+        user_msg_id: Id of the already-committed user message
+        model: LLM model name
+        provider_name: Provider resolved from the model
+        api_key: Decrypted API key for the provider
+        context_future: Pending RAG retrieval, or None
+    """
+    db = new_session()
+    try:
+        # Collect the retrieval result; the search has been running since
+        # before the user message was committed
+        context = context_future.result() if context_future else ""
+
         # Build message history for LLM
         messages = []
-        
-        # Add system message with context if available
-        if context:
-            system_message = (
-                "You are a helpful assistant. Use the following context from the user's documents "
-                "to answer their question. If the context doesn't contain relevant information, "
-                "you can use your general knowledge.\n\n"
-                f"Context:\n{context}"
-            )
-        else:
-            system_message = "You are a helpful assistant."
-        
+
+        # The system prompt stays static — splicing per-turn context into
+        # it would invalidate the provider's prompt-prefix cache every turn
         messages.append({
             'role': 'system',
-            'content': system_message
+            'content': SYSTEM_PROMPT_RAG if context else SYSTEM_PROMPT_BASE
         })
-        
-        # Add conversation history (last 10 messages for context)
-        history_messages = db.query(Message).filter_by(
-            conversation_id=conversation_id
-        ).order_by(Message.timestamp.desc()).limit(10).all()
-        
-        # Reverse to get chronological order
-        history_messages.reverse()
-        
-        for msg in history_messages[:-1]:  # Exclude the message we just added
+
+        # Add conversation history (last 10 messages for context) as plain
+        # column tuples — no ORM object hydration on the per-message path.
+        # LIMIT 11 covers the just-committed user message at rows[0], which
+        # the reversed slice skips without mutating the list.
+        history_rows = db.execute(
+            select(Message.role, Message.content).where(
+                Message.conversation_id == conversation_id
+            ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(11)
+        ).all()
+
+        for role, content in reversed(history_rows[1:]):
+            messages.append({
+                'role': role,
+                'content': content
+            })
+
+        # Retrieved context rides as its own user turn just before the
+        # query, keeping everything earlier in the prompt cacheable
+        if context:
             messages.append({
-                'role': msg.role,
-                'content': msg.content
+                'role': 'user',
+                'content': ''.join((_CTX_PREFIX, context, _CTX_SUFFIX))
             })
-        
+
         # Add current user message
         messages.append({
             'role': 'user',
             'content': user_message
         })
-        
-        # Stream LLM response using user's API key
-        full_response = ""
-        
-        emit('chat_response_start', {'message_id': user_msg.id})
-        
-        # Get provider with user's API key
-        provider_class = get_provider(provider_name).__class__
-        provider = provider_class(api_key=api_key)
-        
+
+        # Stream LLM response using user's API key; chunks collect in a
+        # list and are joined once, instead of quadratic str concatenation
+        parts = []
+
+        socketio.emit('chat_response_start', {'message_id': user_msg_id}, to=sid)
+
+        # Reuse a cached provider (and its HTTP connections) for this key
+        provider = get_provider_for_key(provider_name, api_key)
+
+        buf = []
+        buf_bytes = 0
+        first_flush = True
+        last_flush = time.monotonic()
+
         for chunk in provider.stream_chat(messages, model):
-            full_response += chunk
-            emit('chat_response_chunk', {'chunk': chunk})
-        
-        emit('chat_response_end', {})
-        
-        # Save assistant message to database
-        assistant_msg = Message(
-            conversation_id=conversation_id,
-            role='assistant',
-            content=full_response,
-            model_used=model,
-            timestamp=datetime.utcnow()
-        )
-        db.add(assistant_msg)
-        
-        # Update conversation timestamp
-        conversation.updated_at = datetime.utcnow()
-        
+            parts.append(chunk)
+            buf.append(chunk)
+            buf_bytes += len(chunk)
+
+            # The first chunk goes out immediately so coalescing never
+            # delays the client's time-to-first-token
+            now = time.monotonic()
+            if first_flush or buf_bytes >= STREAM_FLUSH_BYTES or now - last_flush >= STREAM_FLUSH_SECS:
+                first_flush = False
+                socketio.emit('chat_response_chunk', {'chunk': ''.join(buf)}, to=sid)
+                buf = []
+                buf_bytes = 0
+                last_flush = now
+
+        # Flush whatever is left before signalling the end of the stream
+        if buf:
+            socketio.emit('chat_response_chunk', {'chunk': ''.join(buf)}, to=sid)
+
+        socketio.emit('chat_response_end', {}, to=sid)
+
+        full_response = ''.join(parts)
+
+        # Save assistant message to database; RETURNING avoids the extra
+        # refresh round trip and the timestamp is generated server-side
+        assistant_msg_id = db.execute(
+            insert(Message).values(
+                conversation_id=conversation_id,
+                role='assistant',
+                content=full_response,
+                model_used=model
+            ).returning(Message.id)
+        ).scalar_one()
+
+        # Touch the conversation timestamp with a server-side now()
+        conversation = db.get(Conversation, conversation_id)
+        conversation.updated_at = func.now()
+
         # Update conversation title if it's the first message
-        if len(history_messages) <= 1:
+        if len(history_rows) <= 1:
             # Generate a simple title from the first user message
             title = user_message[:50] + ('...' if len(user_message) > 50 else '')
             conversation.title = title
-        
+
         db.commit()
-        db.refresh(assistant_msg)
-        
-        emit('message_complete', {
-            'user_message_id': user_msg.id,
-            'assistant_message_id': assistant_msg.id
-        })
-        
+
+        socketio.emit('message_complete', {
+            'user_message_id': user_msg_id,
+            'assistant_message_id': assistant_msg_id
+        }, to=sid)
+
     except Exception as e:
-        print(f"Error handling chat message: {e}")
+        print(f"Error streaming chat response: {e}")
         import traceback
         traceback.print_exc()
-        emit('error', {'message': f'Error processing message: {str(e)}'})
+        socketio.emit('error', {'message': f'Error processing message: {str(e)}'}, to=sid)
         db.rollback()
+    finally:
+        db.close()
 
 
 @socketio.on('typing')
 def handle_typing(data):
-    """Handle typing indicator (optional feature for future)."""
-    user_id = connected_users.get(request.sid)
-    if user_id:
-        conversation_id = data.get('conversation_id')
-        # Broadcast typing indicator to other users in the conversation (if multi-user)
-        pass
+    """Relay a typing indicator to the user's other connections."""
+    entry = connected_users.get(request.sid)
+    if entry:
+        emit('typing', {'conversation_id': data.get('conversation_id')},
+             to=f"user:{entry['user_id']}", skip_sid=request.sid)
 
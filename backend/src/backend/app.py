@@ -4,9 +4,10 @@ from flask import Flask
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from .config import Config
+from .utils.responses import socketio_json
 
-# Initialize SocketIO
-socketio = SocketIO(cors_allowed_origins="*")
+# Initialize SocketIO; packets are serialized with orjson
+socketio = SocketIO(cors_allowed_origins="*", json=socketio_json)
 
 
 def create_app(config_class=Config):
@@ -29,16 +30,33 @@ def create_app(config_class=Config):
     })
     
     # Initialize SocketIO with the app
-    socketio.init_app(app, 
+    socketio.init_app(app,
                      cors_allowed_origins=config_class.CORS_ORIGINS,
-                     async_mode='threading',
+                     async_mode=config_class.SOCKETIO_ASYNC_MODE,
                      logger=config_class.DEBUG,
                      engineio_logger=config_class.DEBUG)
     
     # Initialize database
     from .db import init_db
     init_db(app)
-    
+
+    # Prewarm the embedding model on a background thread so the first
+    # chat message doesn't pay the model load
+    from .store import warm_embedding_model
+    warm_embedding_model()
+
+    # Open the Chroma client now as well. create_app runs once per
+    # process (after any fork), so each worker gets its own handle and
+    # no first-request stall
+    from .store import get_chroma_client
+    get_chroma_client()
+
+    # Prewarm bcrypt with a throwaway low-cost hash: loads the native
+    # extension and caches the urandom fd outside the first login
+    import bcrypt
+    bcrypt.hashpw(b'x', bcrypt.gensalt(4))
+
+
     # Register blueprints
     from .api import auth_bp, documents_bp, conversations_bp, settings_bp
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -1,8 +1,9 @@
 """Authentication middleware and decorators."""
 
 from functools import wraps
-from flask import request, jsonify
+from flask import request
 from .session import get_user_by_session_token
+from ..utils.responses import ojson
 
 
 def require_auth(f):
@@ -17,12 +18,12 @@ def require_auth(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            return jsonify({'error': 'No authorization token provided'}), 401
+            return ojson({'error': 'No authorization token provided'}), 401
         
         # Parse Bearer token
         parts = auth_header.split()
         if len(parts) != 2 or parts[0].lower() != 'bearer':
-            return jsonify({'error': 'Invalid authorization header format'}), 401
+            return ojson({'error': 'Invalid authorization header format'}), 401
         
         token = parts[1]
         
@@ -30,7 +31,7 @@ def require_auth(f):
         user = get_user_by_session_token(token)
         
         if not user:
-            return jsonify({'error': 'Invalid or expired token'}), 401
+            return ojson({'error': 'Invalid or expired token'}), 401
         
         # Add user to kwargs
         kwargs['current_user'] = user
@@ -1,8 +1,42 @@
 """Session management utilities."""
 
-from datetime import datetime
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
 from ..db import get_db, Session, User
 
+# Fraction of create_session calls that also sweep expired rows. Amortizing
+# the sweep keeps login latency flat while still bounding table growth.
+_CLEANUP_PROBABILITY = 0.05
+
+# token -> (user_id, session_expires_at, cached_until). Authenticating a
+# request or websocket event cost a session plus a user query each time;
+# recently validated tokens are served from this bounded LRU instead.
+_TOKEN_CACHE_TTL = timedelta(seconds=60)
+_TOKEN_CACHE_MAX = 10000
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def _cache_token(token, user_id, session_expires_at):
+    """Remember a validated token, evicting the oldest entry when full."""
+    with _token_cache_lock:
+        if token in _token_cache:
+            _token_cache.move_to_end(token)
+        elif len(_token_cache) >= _TOKEN_CACHE_MAX:
+            _token_cache.popitem(last=False)
+        _token_cache[token] = (
+            user_id, session_expires_at, datetime.utcnow() + _TOKEN_CACHE_TTL
+        )
+
+
+def _evict_token(token):
+    """Forget a cached token, e.g. when its session is invalidated."""
+    with _token_cache_lock:
+        _token_cache.pop(token, None)
+
 
 def create_session(user, hours=24):
     """Create a new session for a user.
@@ -15,9 +49,10 @@ def create_session(user, hours=24):
         Session object with token
     """
     db = get_db()
-    
-    # Clean up expired sessions for this user
-    cleanup_expired_sessions(user.id)
+
+    # Occasionally clean up expired sessions instead of on every login
+    if random.random() < _CLEANUP_PROBABILITY:
+        cleanup_expired_sessions(user.id)
     
     # Create new session
     session = Session.create_for_user(user, hours)
@@ -38,8 +73,12 @@ def get_session_by_token(token):
         Session object if valid, None otherwise
     """
     db = get_db()
-    session = db.query(Session).filter_by(session_token=token).first()
-    
+    # 2.0-style select() reuses the compiled-statement cache on this
+    # per-request hot path instead of recompiling the legacy Query
+    session = db.execute(
+        select(Session).where(Session.session_token == token)
+    ).scalar_one_or_none()
+
     if session and session.is_valid():
         return session
     
@@ -60,10 +99,30 @@ def get_user_by_session_token(token):
     Returns:
         User object if session is valid, None otherwise
     """
+    now = datetime.utcnow()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+        if cached is not None:
+            user_id, session_expires_at, cached_until = cached
+            if now < cached_until and now < session_expires_at:
+                cached_user_id = user_id
+            else:
+                del _token_cache[token]
+                cached_user_id = None
+        else:
+            cached_user_id = None
+
+    if cached_user_id is not None:
+        db = get_db()
+        # PK lookup hits the session identity map before touching the DB
+        return db.get(User, cached_user_id)
+
     session = get_session_by_token(token)
     if session:
+        _cache_token(token, session.user_id, session.expires_at)
         db = get_db()
-        return db.query(User).filter_by(id=session.user_id).first()
+        return db.get(User, session.user_id)
     return None
 
 
@@ -82,6 +141,7 @@ def invalidate_session(token):
     if session:
         db.delete(session)
         db.commit()
+        _evict_token(token)
         return True
     
     return False
@@ -94,15 +154,15 @@ def cleanup_expired_sessions(user_id=None):
         user_id: Optional user ID to clean up sessions for specific user
     """
     db = get_db()
-    query = db.query(Session).filter(Session.expires_at < datetime.utcnow())
-    
+    # One indexed DELETE instead of hydrating every expired row and
+    # deleting it individually. Cached tokens for deleted sessions need no
+    # explicit eviction: the cache rechecks expires_at on every hit, so
+    # expired entries never validate and age out within the TTL.
+    stmt = delete(Session).where(Session.expires_at < datetime.utcnow())
     if user_id:
-        query = query.filter_by(user_id=user_id)
-    
-    expired_sessions = query.all()
-    for session in expired_sessions:
-        db.delete(session)
-    
-    if expired_sessions:
+        stmt = stmt.where(Session.user_id == user_id)
+
+    result = db.execute(stmt)
+    if result.rowcount:
         db.commit()
 
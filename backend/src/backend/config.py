@@ -25,14 +25,36 @@ class Config:
     
     # File Storage
     UPLOADS_PATH = os.getenv('UPLOADS_PATH', str(BASE_DIR / 'uploads'))
+    # When set (e.g. '/protected_files'), document views return an
+    # X-Accel-Redirect header and the front proxy serves the PDF with
+    # sendfile(2) instead of streaming it through a Python worker. The
+    # proxy must map the prefix to UPLOADS_PATH with 'internal;'.
+    ACCEL_REDIRECT_PREFIX = os.getenv('ACCEL_REDIRECT_PREFIX', '')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'pdf'}
     
     # ChromaDB
     CHROMA_PATH = os.getenv('CHROMA_PATH', str(BASE_DIR / 'instance' / 'chroma'))
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    # 'torch' (default) or 'onnx' — the onnx backend runs the encoder
+    # through onnxruntime, which is markedly faster on CPU-only hosts
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+    # Device for the torch backend, e.g. 'cuda' or 'cpu'; empty lets
+    # sentence-transformers pick
+    EMBEDDING_DEVICE = os.getenv('EMBEDDING_DEVICE', '')
+    # Output precision for stored vectors: 'float32' (default) or 'int8'.
+    # int8 quarters embedding memory bandwidth at a small recall cost;
+    # queries are encoded at the same precision so ranking stays
+    # consistent.
+    EMBEDDING_PRECISION = os.getenv('EMBEDDING_PRECISION', 'float32')
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '50'))
+    # HNSW index tuning for new collections. M controls graph connectivity,
+    # construction_ef the build-time candidate list, search_ef the query-time
+    # one — higher values trade index size / latency for recall.
+    CHROMA_HNSW_M = int(os.getenv('CHROMA_HNSW_M', '32'))
+    CHROMA_HNSW_EF_CONSTRUCTION = int(os.getenv('CHROMA_HNSW_EF_CONSTRUCTION', '200'))
+    CHROMA_HNSW_EF_SEARCH = int(os.getenv('CHROMA_HNSW_EF_SEARCH', '64'))
     
     # LLM API Keys
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
@@ -42,6 +64,15 @@ class Config:
     
     # Session
     SESSION_EXPIRY_HOURS = int(os.getenv('SESSION_EXPIRY_HOURS', '24'))
+
+    # bcrypt work factor; each +1 doubles hash time. Lower it on
+    # constrained hardware — existing hashes upgrade on next login.
+    BCRYPT_COST = int(os.getenv('BCRYPT_COST', '12'))
+
+    # SocketIO async mode: 'threading' (default), 'eventlet' or 'gevent'.
+    # The greenlet modes multiplex I/O-bound handlers on one event loop
+    # instead of holding a worker thread per in-flight request.
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
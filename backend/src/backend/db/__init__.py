@@ -1,6 +1,6 @@
 """Database initialization and utilities."""
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from .models import Base, User, Session, Conversation, Message, Document, ApiKey, ConversationDocument
 
@@ -9,16 +9,48 @@ SessionLocal = None
 engine = None
 
 
+def _tune_sqlite_connection(dbapi_connection, connection_record):
+    """Apply performance PRAGMAs to every new SQLite connection.
+
+    WAL lets readers proceed while a writer commits, synchronous=NORMAL
+    drops the per-commit fsync that FULL pays on top of the WAL append,
+    and the cache/temp settings keep hot pages and sorts in memory.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    # Memory-map the database file so reads bypass the page cache copy
+    cursor.execute("PRAGMA mmap_size=268435456")
+    # Let writers wait out a busy lock instead of failing immediately
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
 def init_db(app):
     """Initialize the database with the Flask app."""
     global SessionLocal, engine
-    
-    # Create engine
+
+    # Create engine with a warm connection pool so hot handlers reuse
+    # connections instead of reopening the database per request
     engine = create_engine(
         app.config['SQLALCHEMY_DATABASE_URI'],
-        echo=app.config['DEBUG']
+        echo=app.config['DEBUG'],
+        # Room for every hot statement in the compiled-statement cache
+        query_cache_size=1200,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        # Recycle connections after 30 minutes so long-lived ones don't
+        # accumulate stale state
+        pool_recycle=1800,
+        connect_args={'check_same_thread': False}
     )
-    
+
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _tune_sqlite_connection)
+
     # Create session factory
     SessionLocal = scoped_session(sessionmaker(bind=engine))
     
@@ -41,5 +73,17 @@ def get_db():
     return SessionLocal()
 
 
-__all__ = ['init_db', 'get_db', 'User', 'Session', 'Conversation', 'Message', 'Document', 'ApiKey', 'ConversationDocument']
+def new_session():
+    """Create a standalone session outside the request scope.
+
+    Unlike get_db(), the caller owns the session's lifetime — long-lived
+    consumers such as websocket connections hold one and close it on
+    disconnect instead of checking a session out per event.
+    """
+    if SessionLocal is None:
+        raise RuntimeError("Database not initialized. Call init_db first.")
+    return SessionLocal.session_factory()
+
+
+__all__ = ['init_db', 'get_db', 'new_session', 'User', 'Session', 'Conversation', 'Message', 'Document', 'ApiKey', 'ConversationDocument']
 
@@ -0,0 +1,15 @@
+"""Database and vector-store migrations."""
+
+from .add_model_columns import AddModelColumnsMigration
+from .consolidate_collections import ConsolidateCollectionsMigration
+from .conversation_document_unique import ConversationDocumentUniqueMigration
+from .documents_fts import DocumentsFtsMigration
+from .rebuild_hnsw import RebuildHnswMigration
+
+__all__ = [
+    'AddModelColumnsMigration',
+    'ConsolidateCollectionsMigration',
+    'ConversationDocumentUniqueMigration',
+    'DocumentsFtsMigration',
+    'RebuildHnswMigration',
+]
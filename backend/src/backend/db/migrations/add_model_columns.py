@@ -0,0 +1,80 @@
+"""Migration to add model columns that create_all never backfills.
+
+``Base.metadata.create_all`` only creates missing tables, so databases
+from before these columns landed never acquire them: without
+``users.password_hmac`` the login prefilter and check-password endpoint
+fail with "no such column", and without ``documents.content_hash`` the
+duplicate-upload check breaks uploads the same way. This migration adds
+both columns (and their indexes) to existing tables in place.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from .. import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class AddModelColumnsMigration:
+    """Add password_hmac and content_hash to pre-existing databases."""
+
+    # (table, column, column DDL, index name) — index names match what
+    # create_all generates for Column(index=True) on fresh databases
+    COLUMNS = (
+        ('users', 'password_hmac', 'VARCHAR(64)', 'ix_users_password_hmac'),
+        ('documents', 'content_hash', 'VARCHAR(64)', 'ix_documents_content_hash'),
+    )
+
+    def _existing_columns(self, db, table):
+        """Get the column names a table currently has.
+
+        Args:
+            db: Session to query with
+            table: Table name
+
+        Returns:
+            Set of column names
+        """
+        rows = db.execute(text(f"PRAGMA table_info({table})")).all()
+        return {row[1] for row in rows}
+
+    def up(self):
+        """Run the migration."""
+        db = get_db()
+
+        for table, column, ddl_type, index_name in self.COLUMNS:
+            if column not in self._existing_columns(db, table):
+                db.execute(text(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"
+                ))
+                logger.info("Added %s.%s", table, column)
+            db.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})"
+            ))
+
+        db.commit()
+        logger.info("Model columns present")
+
+    def down(self):
+        """Reverse the migration."""
+        db = get_db()
+
+        for table, column, _ddl_type, index_name in self.COLUMNS:
+            db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            if column in self._existing_columns(db, table):
+                db.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+        db.commit()
+        logger.info("Model columns dropped")
+
+
+def run():
+    """Entry point for running the migration standalone."""
+    logging.basicConfig(level=logging.INFO)
+    AddModelColumnsMigration().up()
+
+
+if __name__ == '__main__':
+    run()
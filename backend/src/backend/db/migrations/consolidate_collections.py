@@ -0,0 +1,392 @@
+"""Migration to consolidate per-document ChromaDB collections into per-user collections.
+
+Historically every uploaded document got its own collection named
+``doc_{user_id}_{document_id}``. This migration moves all chunks into a single
+``user_{user_id}_docs`` collection per user (keeping ``doc_id`` metadata for
+filtering) and updates ``Document.chroma_collection_id`` accordingly.
+"""
+
+import logging
+import os
+from collections import defaultdict
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from .. import get_db, User, Document
+from ...store import get_chroma_client, get_collection, delete_collection, hnsw_metadata
+
+logger = logging.getLogger(__name__)
+
+
+class ConsolidateCollectionsMigration:
+    """Consolidate per-document collections into one collection per user."""
+
+    # Number of chunks copied per Chroma get/add round-trip. Paging keeps peak
+    # memory bounded at O(BATCH_SIZE) instead of O(chunks per document).
+    BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+
+    # Number of migrated documents between SQL commits. Batching commits
+    # avoids one fsync per user while keeping transactions reasonably small.
+    COMMIT_EVERY = int(os.getenv('MIGRATION_COMMIT_EVERY', '200'))
+
+    # Worker threads for the per-user migration. Different users touch
+    # disjoint collections and rows, so the work is safe to run in parallel.
+    MAX_WORKERS = int(os.getenv('MIGRATION_MAX_WORKERS', '8'))
+
+    # Worker threads for the post-commit cleanup of old collections
+    DELETE_WORKERS = int(os.getenv('MIGRATION_DELETE_WORKERS', '16'))
+
+    # Target payload size per Chroma round trip. The row count per batch is
+    # derived from this and the embedding dimension, so wide embeddings get
+    # proportionally smaller batches instead of multi-hundred-MB payloads.
+    TARGET_BATCH_BYTES = int(os.getenv('MIGRATION_TARGET_BATCH_BYTES', str(10 * 1024 * 1024)))
+
+    def __init__(self):
+        self.client = get_chroma_client()
+        # Short-lived sessions are opened per operation and per worker, so
+        # flush cost stays proportional to one user's work instead of
+        # everything dirtied since the start of the run
+        self.SessionFactory = sessionmaker(bind=get_db().get_bind())
+        # Per-run collection handle cache, seeded lazily from one
+        # list_collections() call
+        self._collection_cache = {}
+        self._existing_names = None
+
+    def _get_user_collection(self, user_id):
+        """Get or create the consolidated collection for a user.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Collection object
+        """
+        collection = self.client.get_or_create_collection(
+            name=f"user_{user_id}_docs",
+            metadata=hnsw_metadata()
+        )
+        self._known_collection_names().add(collection.name)
+        self._collection_cache[collection.name] = collection
+        return collection
+
+    def _known_collection_names(self):
+        """Get the names of all existing collections, fetched once per run.
+
+        Returns:
+            Set of collection names
+        """
+        if self._existing_names is None:
+            self._existing_names = {c.name for c in self.client.list_collections()}
+        return self._existing_names
+
+    def _get_cached_collection(self, collection_name):
+        """Get a collection, caching handles for the lifetime of this run.
+
+        Collections known to be missing are skipped without a lookup.
+
+        Args:
+            collection_name: Name of the collection
+
+        Returns:
+            Collection object or None if not found
+        """
+        if collection_name not in self._known_collection_names():
+            return None
+
+        if collection_name not in self._collection_cache:
+            self._collection_cache[collection_name] = get_collection(collection_name)
+
+        return self._collection_cache[collection_name]
+
+    def _get_users_with_documents(self, db):
+        """Load all users with their documents in a single round trip.
+
+        Args:
+            db: Session to query with
+
+        Returns:
+            List of User objects with the documents relationship populated
+        """
+        return db.query(User).options(selectinload(User.documents)).all()
+
+    def _tuned_batch_size(self, embeddings):
+        """Derive a batch size targeting roughly TARGET_BATCH_BYTES per batch.
+
+        Args:
+            embeddings: A fetched page of embeddings, used to read the dimension
+
+        Returns:
+            Number of chunks per batch
+        """
+        dim = len(embeddings[0])
+        return max(64, min(4096, self.TARGET_BATCH_BYTES // (dim * 4)))
+
+    def _copy_chunks(self, source_collection, target_collection):
+        """Copy all chunks from one collection to another in batches.
+
+        The next batch is fetched on a prefetch thread while the current
+        batch is being written, so reads and writes overlap.
+
+        Args:
+            source_collection: Collection to read from
+            target_collection: Collection to write to
+
+        Returns:
+            Number of chunks copied
+        """
+        def fetch(offset, limit):
+            return source_collection.get(
+                limit=limit,
+                offset=offset,
+                include=['embeddings', 'documents', 'metadatas']
+            )
+
+        copied = 0
+        batch_size = self.BATCH_SIZE
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_batch = prefetcher.submit(fetch, 0, batch_size)
+
+            while True:
+                batch = next_batch.result()
+
+                if not batch['ids']:
+                    break
+
+                # The first page reveals the embedding dimension; retune the
+                # remaining pages to the payload-size target
+                if copied == 0 and len(batch['embeddings']) > 0:
+                    batch_size = self._tuned_batch_size(batch['embeddings'])
+
+                copied += len(batch['ids'])
+                next_batch = prefetcher.submit(fetch, copied, batch_size)
+
+                # A contiguous float32 array hands Chroma a compact buffer
+                # instead of nested Python float lists. upsert keeps
+                # reruns idempotent: a run that died between copying and
+                # the Document update re-selects the same document, and
+                # add would refuse its already-copied chunk ids.
+                target_collection.upsert(
+                    ids=batch['ids'],
+                    embeddings=np.asarray(batch['embeddings'], dtype=np.float32),
+                    documents=batch['documents'],
+                    metadatas=batch['metadatas']
+                )
+
+        return copied
+
+    def _migrate_user(self, user_id):
+        """Migrate one user's documents into their consolidated collection.
+
+        Runs in a worker thread with its own short-lived session.
+
+        Args:
+            user_id: User ID to migrate
+        """
+        with self.SessionFactory() as session:
+            # The NOT LIKE predicate keeps already-consolidated rows on the
+            # SQL side, so re-runs return nothing instead of the whole table
+            documents = session.query(Document).filter(
+                Document.user_id == user_id,
+                ~Document.chroma_collection_id.like('user_%')
+            ).all()
+            migrated_ids = []
+            to_delete = []
+            new_collection_name = None
+
+            for doc in documents:
+                old_collection_name = doc.chroma_collection_id
+
+                old_collection = self._get_cached_collection(old_collection_name)
+                if old_collection is None:
+                    logger.debug("Collection %s not found, skipping doc %s", old_collection_name, doc.id)
+                    continue
+
+                user_collection = self._get_user_collection(user_id)
+                new_collection_name = user_collection.name
+
+                copied = self._copy_chunks(old_collection, user_collection)
+
+                migrated_ids.append(doc.id)
+                to_delete.append(old_collection_name)
+
+                logger.debug("Migrated doc %s (%s chunks) into %s", doc.id, copied, new_collection_name)
+
+            # One bulk UPDATE covers every successfully copied document,
+            # instead of one ORM-dirtied UPDATE per row at flush time
+            if migrated_ids:
+                session.execute(
+                    update(Document)
+                    .where(Document.id.in_(migrated_ids))
+                    .values(chroma_collection_id=new_collection_name)
+                )
+
+            session.commit()
+
+            # Delete old collections only after the DB update is durable, in
+            # parallel rather than one synchronous delete per document
+            if to_delete:
+                with ThreadPoolExecutor(max_workers=self.DELETE_WORKERS) as pool:
+                    list(pool.map(delete_collection, to_delete))
+
+                # Keep the per-run cache coherent with the deletions
+                for name in to_delete:
+                    self._collection_cache.pop(name, None)
+                    self._known_collection_names().discard(name)
+
+    def up(self):
+        """Move every per-document collection into its user's collection."""
+        with self.SessionFactory() as db:
+            user_ids = [user_id for (user_id,) in db.query(User.id).all()]
+
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as pool:
+            futures = {pool.submit(self._migrate_user, user_id): user_id for user_id in user_ids}
+
+            for future in as_completed(futures):
+                user_id = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Failed to migrate user %s: %s", user_id, e)
+
+        logger.info("Migration complete")
+
+    def down(self):
+        """Split consolidated user collections back into per-document collections."""
+        with self.SessionFactory() as db:
+            self._down(db)
+
+        logger.info("Rollback complete")
+
+    def _down(self, db):
+        """Run the rollback body against one short-lived session.
+
+        Args:
+            db: Session to work with
+        """
+        users = self._get_users_with_documents(db)
+        updated = 0
+
+        with db.no_autoflush:
+            for user in users:
+                user_collection = self._get_cached_collection(f"user_{user.id}_docs")
+                if user_collection is None:
+                    continue
+
+                user_prefix = f"user_{user.id}_"
+                docs_to_restore = [
+                    doc for doc in user.documents
+                    if doc.chroma_collection_id.startswith(user_prefix)
+                ]
+                if not docs_to_restore:
+                    continue
+
+                # Discover every chunk id for this user's documents in one
+                # where-$in call and bucket them per doc client-side
+                id_data = user_collection.get(
+                    where={"doc_id": {"$in": [str(doc.id) for doc in docs_to_restore]}},
+                    include=['metadatas']
+                )
+
+                ids_by_doc = defaultdict(list)
+                for chunk_id, metadata in zip(id_data['ids'], id_data['metadatas']):
+                    ids_by_doc[metadata['doc_id']].append(chunk_id)
+
+                for doc in docs_to_restore:
+                    chunk_ids = ids_by_doc.get(str(doc.id), [])
+
+                    new_collection_name = f"doc_{user.id}_{doc.id}"
+                    new_collection = self.client.get_or_create_collection(
+                        name=new_collection_name,
+                        metadata=hnsw_metadata()
+                    )
+
+                    # Page the heavy payload by id slices so the vectors are
+                    # loaded once, in bounded batches
+                    start = 0
+                    batch_size = self.BATCH_SIZE
+                    while start < len(chunk_ids):
+                        page_ids = chunk_ids[start:start + batch_size]
+                        payload = user_collection.get(
+                            ids=page_ids,
+                            include=['embeddings', 'documents', 'metadatas']
+                        )
+
+                        # The first page reveals the embedding dimension;
+                        # retune later pages to the payload-size target
+                        if start == 0 and len(payload['embeddings']) > 0:
+                            batch_size = self._tuned_batch_size(payload['embeddings'])
+
+                        new_collection.add(
+                            ids=payload['ids'],
+                            embeddings=np.asarray(payload['embeddings'], dtype=np.float32),
+                            documents=payload['documents'],
+                            metadatas=payload['metadatas']
+                        )
+
+                        start += len(page_ids)
+
+                    # One metadata-filtered delete removes the copied
+                    # chunks server-side instead of shipping id pages back
+                    if chunk_ids:
+                        user_collection.delete(where={"doc_id": str(doc.id)})
+
+                    doc.chroma_collection_id = new_collection_name
+
+                    logger.debug("Restored doc %s (%s chunks) into %s", doc.id, len(chunk_ids), new_collection_name)
+
+                    updated += 1
+                    if updated % self.COMMIT_EVERY == 0:
+                        db.commit()
+
+        db.commit()
+
+    def dry_run(self):
+        """Preview what the migration would do without changing anything.
+
+        Returns:
+            Dict describing affected users, documents and collections
+        """
+        preview = {
+            'users_affected': 0,
+            'documents_to_migrate': 0,
+            'estimated_chunks': 0,
+            'collections_to_create': set(),
+            'collections_to_delete': set()
+        }
+
+        # The NOT LIKE predicate keeps already-consolidated rows on the SQL
+        # side, so a re-run previews an empty migration without a table scan
+        with self.SessionFactory() as db:
+            documents = db.query(Document).filter(
+                ~Document.chroma_collection_id.like('user_%')
+            ).all()
+
+        affected_users = set()
+
+        for doc in documents:
+            old_collection_name = doc.chroma_collection_id
+
+            old_collection = self._get_cached_collection(old_collection_name)
+            if old_collection is None:
+                continue
+
+            affected_users.add(doc.user_id)
+            preview['documents_to_migrate'] += 1
+            # count() returns a single integer instead of pulling every
+            # chunk payload (including embeddings) over the wire
+            preview['estimated_chunks'] += old_collection.count()
+
+            preview['collections_to_create'].add(f"user_{doc.user_id}_docs")
+            preview['collections_to_delete'].add(old_collection_name)
+
+        preview['users_affected'] = len(affected_users)
+
+        preview['collections_to_create'] = sorted(preview['collections_to_create'])
+        preview['collections_to_delete'] = sorted(preview['collections_to_delete'])
+
+        return preview
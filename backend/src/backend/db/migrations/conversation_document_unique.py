@@ -0,0 +1,93 @@
+"""Migration to enforce unique conversation-document attachments.
+
+The attach endpoint relies on ``uq_conversation_document`` for its
+INSERT OR IGNORE duplicate handling, but ``create_all`` never adds
+constraints to existing tables — on upgraded installs the insert always
+succeeds and duplicate attaches create real duplicate rows. This
+migration removes any duplicates that already slipped in and adds a
+unique index so the conflict clause works everywhere.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from .. import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationDocumentUniqueMigration:
+    """Dedupe conversation_documents and add the unique index."""
+
+    INDEX_NAME = 'uq_conversation_document'
+
+    def _has_unique_index(self, db):
+        """Check whether a unique index already covers the pair.
+
+        Fresh databases get the constraint from create_all under an
+        sqlite autoindex name, so the check looks at the indexed columns
+        rather than the name.
+
+        Args:
+            db: Session to query with
+
+        Returns:
+            True if (conversation_id, document_id) is already unique
+        """
+        indexes = db.execute(
+            text("PRAGMA index_list(conversation_documents)")
+        ).all()
+        for index in indexes:
+            if not index[2]:  # unique flag
+                continue
+            columns = [
+                row[2] for row in
+                db.execute(text(f"PRAGMA index_info({index[1]})")).all()
+            ]
+            if sorted(columns) == ['conversation_id', 'document_id']:
+                return True
+        return False
+
+    def up(self):
+        """Run the migration."""
+        db = get_db()
+
+        if self._has_unique_index(db):
+            logger.info("Unique attachment index already present")
+            return
+
+        # Existing duplicates would block the unique index; keep the
+        # earliest attach of each pair
+        result = db.execute(text(
+            "DELETE FROM conversation_documents WHERE id NOT IN ("
+            "SELECT MIN(id) FROM conversation_documents "
+            "GROUP BY conversation_id, document_id)"
+        ))
+        if result.rowcount:
+            logger.info("Removed %d duplicate attachment(s)", result.rowcount)
+
+        db.execute(text(
+            f"CREATE UNIQUE INDEX {self.INDEX_NAME} "
+            "ON conversation_documents (conversation_id, document_id)"
+        ))
+
+        db.commit()
+        logger.info("Unique attachment index created")
+
+    def down(self):
+        """Reverse the migration."""
+        db = get_db()
+        db.execute(text(f"DROP INDEX IF EXISTS {self.INDEX_NAME}"))
+        db.commit()
+        logger.info("Unique attachment index dropped")
+
+
+def run():
+    """Entry point for running the migration standalone."""
+    logging.basicConfig(level=logging.INFO)
+    ConversationDocumentUniqueMigration().up()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,74 @@
+"""Migration to add an FTS5 index over document filenames.
+
+The chat path can use a full-text match as a cheap pre-filter over the
+documents attached to a conversation, only vector-searching the
+collections whose documents look relevant to a keyword-like query. The
+virtual table is an external-content FTS5 index over ``documents`` kept
+in sync by triggers.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from .. import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentsFtsMigration:
+    """Create the documents_fts virtual table and its sync triggers."""
+
+    def up(self):
+        """Run the migration."""
+        db = get_db()
+
+        db.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts "
+            "USING fts5(filename, content='documents', content_rowid='id')"
+        ))
+
+        db.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS documents_fts_ai "
+            "AFTER INSERT ON documents BEGIN "
+            "INSERT INTO documents_fts(rowid, filename) "
+            "VALUES (new.id, new.filename); END"
+        ))
+        db.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS documents_fts_ad "
+            "AFTER DELETE ON documents BEGIN "
+            "INSERT INTO documents_fts(documents_fts, rowid, filename) "
+            "VALUES ('delete', old.id, old.filename); END"
+        ))
+        db.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS documents_fts_au "
+            "AFTER UPDATE ON documents BEGIN "
+            "INSERT INTO documents_fts(documents_fts, rowid, filename) "
+            "VALUES ('delete', old.id, old.filename); "
+            "INSERT INTO documents_fts(rowid, filename) "
+            "VALUES (new.id, new.filename); END"
+        ))
+
+        # Backfill the index from the existing rows
+        db.execute(text("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')"))
+        db.commit()
+        logger.info("documents_fts index created and rebuilt")
+
+    def down(self):
+        """Reverse the migration."""
+        db = get_db()
+        for trigger in ('documents_fts_ai', 'documents_fts_ad', 'documents_fts_au'):
+            db.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        db.execute(text("DROP TABLE IF EXISTS documents_fts"))
+        db.commit()
+        logger.info("documents_fts index dropped")
+
+
+def run():
+    """Entry point for running the migration standalone."""
+    logging.basicConfig(level=logging.INFO)
+    DocumentsFtsMigration().up()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,174 @@
+"""Migration to rebuild Chroma collections with tuned HNSW parameters.
+
+Collections created before the HNSW tuning landed carry only the default
+index settings, and Chroma index parameters are immutable after creation.
+This migration copies each untuned collection through a temporary twin and
+recreates it under the same name with the metadata from
+``store.hnsw_metadata()``, so query latency stops growing linearly once
+corpora get large.
+"""
+
+import logging
+import os
+
+from ...store import get_chroma_client, hnsw_metadata
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildHnswMigration:
+    """Recreate untuned collections with the configured HNSW parameters."""
+
+    # Chunks copied per get/add round trip — bounds peak memory at
+    # O(BATCH_SIZE) vectors regardless of collection size
+    BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+
+    _TMP_SUFFIX = '__hnsw_rebuild'
+
+    def __init__(self):
+        self.client = get_chroma_client()
+
+    def _needs_rebuild(self, collection):
+        """Check whether a collection lags the configured index settings.
+
+        Args:
+            collection: Chroma collection object
+
+        Returns:
+            True if the collection lacks the hnsw:M setting or was built
+            with a different distance space
+        """
+        metadata = collection.metadata or {}
+        return (
+            'hnsw:M' not in metadata
+            or metadata.get('hnsw:space') != hnsw_metadata()['hnsw:space']
+        )
+
+    def _copy_all(self, source, target):
+        """Copy every chunk from source into target in bounded pages.
+
+        Args:
+            source: Collection to read from
+            target: Collection to write to
+        """
+        offset = 0
+        while True:
+            page = source.get(
+                limit=self.BATCH_SIZE,
+                offset=offset,
+                include=['embeddings', 'documents', 'metadatas']
+            )
+            if not page['ids']:
+                break
+
+            target.add(
+                ids=page['ids'],
+                embeddings=page['embeddings'],
+                documents=page['documents'],
+                metadatas=page['metadatas']
+            )
+            offset += len(page['ids'])
+
+    def _rebuild(self, name):
+        """Rebuild one collection under its original name.
+
+        Args:
+            name: Collection name
+        """
+        source = self.client.get_collection(name=name)
+        tmp_name = name + self._TMP_SUFFIX
+
+        # Stage the data in a twin first so a failure mid-copy leaves the
+        # original collection untouched
+        try:
+            self.client.delete_collection(name=tmp_name)
+        except Exception:
+            pass
+        tmp = self.client.create_collection(name=tmp_name, metadata=hnsw_metadata())
+        self._copy_all(source, tmp)
+
+        expected = tmp.count()
+        self.client.delete_collection(name=name)
+        rebuilt = self.client.create_collection(name=name, metadata=hnsw_metadata())
+        self._copy_all(tmp, rebuilt)
+
+        # The twin is the only complete copy until the copy-back is
+        # verified; never drop it on a short count
+        if rebuilt.count() != expected:
+            raise RuntimeError(
+                f"Rebuild of {name} is incomplete "
+                f"({rebuilt.count()}/{expected} chunks); staging twin kept"
+            )
+        self.client.delete_collection(name=tmp_name)
+
+    def _recover_twin(self, tmp_name):
+        """Finish an interrupted rebuild from its staging twin.
+
+        A leftover twin is only safe to drop when the crash happened
+        during staging, while the original still held every chunk. If the
+        run died after the original was deleted — mid copy-back — the
+        twin is the sole surviving copy, and a partially repopulated
+        original already carries tuned metadata, so nothing else would
+        flag the loss. Restore from the twin whenever the original is
+        missing or short.
+
+        Args:
+            tmp_name: Name of the leftover staging twin
+        """
+        name = tmp_name[:-len(self._TMP_SUFFIX)]
+        tmp = self.client.get_collection(name=tmp_name)
+        expected = tmp.count()
+
+        try:
+            base = self.client.get_collection(name=name)
+        except Exception:
+            base = None
+
+        if base is not None and base.count() >= expected:
+            # Crash during staging; the original is complete
+            self.client.delete_collection(name=tmp_name)
+            return
+
+        logger.info("Restoring collection %s from its staging twin", name)
+        if base is not None:
+            self.client.delete_collection(name=name)
+        restored = self.client.create_collection(name=name, metadata=hnsw_metadata())
+        self._copy_all(tmp, restored)
+
+        if restored.count() != expected:
+            raise RuntimeError(
+                f"Restore of {name} is incomplete "
+                f"({restored.count()}/{expected} chunks); staging twin kept"
+            )
+        self.client.delete_collection(name=tmp_name)
+
+    def up(self):
+        """Run the migration."""
+        logger.info("Scanning collections for untuned HNSW settings...")
+
+        rebuilt = 0
+        for collection in self.client.list_collections():
+            name = collection.name
+            if name.endswith(self._TMP_SUFFIX):
+                # Leftover from an interrupted run; restore from it if
+                # the original didn't survive intact
+                self._recover_twin(name)
+                continue
+            if not self._needs_rebuild(collection):
+                continue
+
+            logger.info("Rebuilding collection %s with tuned HNSW index", name)
+            self._rebuild(name)
+            rebuilt += 1
+
+        logger.info("Rebuilt %d collection(s)", rebuilt)
+
+
+def run():
+    """Entry point for running the migration standalone."""
+    logging.basicConfig(level=logging.INFO)
+    RebuildHnswMigration().up()
+
+
+if __name__ == '__main__':
+    run()
@@ -1,14 +1,29 @@
 """SQLAlchemy database models."""
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from hashlib import sha256
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text, UniqueConstraint, func, select
+from sqlalchemy.orm import column_property
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, reconstructor
+# bcrypt 4.x is the Rust-backed implementation; hashing runs in native
+# code and releases the GIL for the duration of the Blowfish rounds
 import bcrypt
+import hmac
 import secrets
 
+from ..config import Config
+
 Base = declarative_base()
 
+# bcrypt calls run on this pool: the native code releases the GIL so
+# hashes execute in parallel across cores, and the cpu_count cap keeps a
+# burst of logins from oversubscribing the machine with 300ms hashes
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
 
 class User(Base):
     """User model."""
@@ -17,6 +32,7 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     username = Column(String(100), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
+    password_hmac = Column(String(64), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -25,27 +41,83 @@ class User(Base):
     documents = relationship('Document', back_populates='user', cascade='all, delete-orphan')
     api_keys = relationship('ApiKey', back_populates='user', cascade='all, delete-orphan')
     
-    def set_password(self, password):
-        """Hash and set the user's password."""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    
+    @reconstructor
+    def _init_on_load(self):
+        """Cache the encoded hash when the row is loaded.
+
+        Saves a UTF-8 encode per check_password call; bcrypt.checkpw
+        itself compares in constant time.
+        """
+        self._pw_bytes = self.password_hash.encode('utf-8')
+
+    @staticmethod
+    def hmac_password(password):
+        """Compute the keyed HMAC of a password used as an index prefilter."""
+        return hmac.new(
+            Config.SECRET_KEY.encode('utf-8'),
+            password.encode('utf-8'),
+            sha256
+        ).hexdigest()
+
+    def set_password(self, password, cost=None):
+        """Hash and set the user's password.
+
+        Args:
+            password: Plaintext password
+            cost: bcrypt work factor (default: Config.BCRYPT_COST)
+        """
+        hashed = _HASH_POOL.submit(
+            bcrypt.hashpw, password.encode('utf-8'),
+            bcrypt.gensalt(rounds=cost or Config.BCRYPT_COST)
+        ).result()
+        self.password_hash = hashed.decode('utf-8')
+        self._pw_bytes = hashed
+        self.password_hmac = User.hmac_password(password)
+
     def check_password(self, password):
-        """Check if the provided password matches the hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Check if the provided password matches the hash.
+
+        On a successful match, a hash stored at a lower cost than
+        Config.BCRYPT_COST is transparently rehashed at the current
+        target; the caller's commit persists it.
+        """
+        pw_bytes = getattr(self, '_pw_bytes', None)
+        if pw_bytes is None:
+            pw_bytes = self.password_hash.encode('utf-8')
+            self._pw_bytes = pw_bytes
+        matched = _HASH_POOL.submit(
+            bcrypt.checkpw, password.encode('utf-8'), pw_bytes
+        ).result()
+
+        if matched:
+            # Cost lives in the '$2b$NN$' prefix of the modular crypt format
+            try:
+                stored_cost = int(self.password_hash[4:6])
+            except ValueError:
+                stored_cost = Config.BCRYPT_COST
+            if stored_cost < Config.BCRYPT_COST:
+                self.set_password(password)
+
+        return matched
     
     def to_dict(self):
         """Convert user to dictionary."""
         return {
             'id': self.id,
             'username': self.username,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
 
 class Session(Base):
     """Session model for managing user sessions."""
     __tablename__ = 'sessions'
-    
+    __table_args__ = (
+        # Serves the expired-session sweep as one indexed range delete
+        Index('ix_sessions_user_expires', 'user_id', 'expires_at'),
+    )
+
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     session_token = Column(String(255), unique=True, nullable=False)
@@ -57,8 +129,14 @@ class Session(Base):
     
     @staticmethod
     def generate_token():
-        """Generate a secure session token."""
-        return secrets.token_urlsafe(32)
+        """Generate a secure, time-ordered session token.
+
+        The millisecond timestamp prefix gives UUIDv7-style locality:
+        new tokens sort last, so unique-index inserts append to the
+        rightmost B-tree page instead of splitting random interior
+        pages. The random tail still carries 192 bits of entropy.
+        """
+        return f'{int(time.time() * 1000):012x}{secrets.token_urlsafe(24)}'
     
     @staticmethod
     def create_for_user(user, hours=24):
@@ -80,23 +158,33 @@ class Session(Base):
             'id': self.id,
             'user_id': self.user_id,
             'session_token': self.session_token,
-            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+            'expires_at': self.expires_at
         }
 
 
 class Conversation(Base):
     """Conversation model."""
     __tablename__ = 'conversations'
-    
+    __table_args__ = (
+        # Serves the newest-first listing with keyset pagination
+        Index('ix_conversations_user_updated', 'user_id', 'updated_at'),
+    )
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     title = Column(String(255), default='New Conversation')
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
+    # Generated by the database so inserts and touch-updates don't ship a
+    # Python datetime parameter per statement. default= renders now()
+    # into the INSERT itself, because tables from before this change
+    # lack the DDL default and would otherwise store NULL.
+    updated_at = Column(DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
+
     # Relationships
     user = relationship('User', back_populates='conversations')
-    messages = relationship('Message', back_populates='conversation', cascade='all, delete-orphan', order_by='Message.timestamp')
+    # id tiebreak keeps ordering stable when consecutive messages land
+    # within the timestamp's one-second resolution
+    messages = relationship('Message', back_populates='conversation', cascade='all, delete-orphan', order_by='[Message.timestamp, Message.id]')
     conversation_documents = relationship('ConversationDocument', back_populates='conversation', cascade='all, delete-orphan')
     
     def to_dict(self, include_messages=False, include_documents=False):
@@ -105,9 +193,15 @@ class Conversation(Base):
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'message_count': len(self.messages)
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            # Count from the already-loaded collection when present;
+            # otherwise the deferred column property counts in SQL
+            # without materializing the message rows
+            'message_count': (
+                len(self.messages) if 'messages' in self.__dict__
+                else self.message_count
+            )
         }
         if include_messages:
             data['messages'] = [msg.to_dict() for msg in self.messages]
@@ -119,13 +213,22 @@ class Conversation(Base):
 class Message(Base):
     """Message model."""
     __tablename__ = 'messages'
-    
+    __table_args__ = (
+        # Serves the history fetch and the per-conversation count as an
+        # index range scan instead of a filtered scan plus sort
+        Index('ix_messages_conv_timestamp', 'conversation_id', 'timestamp'),
+    )
+
+
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
     model_used = Column(String(100))  # The LLM model used for assistant messages
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # default= keeps the now() inside the INSERT statement on databases
+    # created before the DDL default existed; NULL timestamps would sort
+    # newest messages out of the history window
+    timestamp = Column(DateTime, default=func.now(), server_default=func.now())
     
     # Relationships
     conversation = relationship('Conversation', back_populates='messages')
@@ -138,18 +241,36 @@ class Message(Base):
             'role': self.role,
             'content': self.content,
             'model_used': self.model_used,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'timestamp': self.timestamp
         }
 
 
+# Declared after Message so the subquery can reference it. Deferred, so
+# the extra SELECT only runs when message_count is actually read on an
+# instance whose messages were not loaded.
+Conversation.message_count = column_property(
+    select(func.count(Message.id))
+    .where(Message.conversation_id == Conversation.id)
+    .correlate_except(Message)
+    .scalar_subquery(),
+    deferred=True
+)
+
+
 class Document(Base):
     """Document model."""
     __tablename__ = 'documents'
-    
+    __table_args__ = (
+        # Serves the newest-first listing with keyset pagination
+        Index('ix_documents_user_uploaded', 'user_id', 'uploaded_at'),
+    )
+
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
+    content_hash = Column(String(64), index=True)
     chroma_collection_id = Column(String(255), nullable=False)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     
@@ -164,14 +285,19 @@ class Document(Base):
             'user_id': self.user_id,
             'filename': self.filename,
             'chroma_collection_id': self.chroma_collection_id,
-            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None
+            'uploaded_at': self.uploaded_at
         }
 
 
 class ApiKey(Base):
     """API Key model for storing encrypted user API keys."""
     __tablename__ = 'api_keys'
-    
+    __table_args__ = (
+        # Serves the per-user key listing and (user, provider) lookups
+        Index('ix_api_keys_user_provider', 'user_id', 'provider'),
+    )
+
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     provider = Column(String(50), nullable=False)  # 'openai', 'anthropic', 'google', 'grok'
@@ -188,8 +314,8 @@ class ApiKey(Base):
             'id': self.id,
             'user_id': self.user_id,
             'provider': self.provider,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         if include_key:
             data['encrypted_key'] = self.encrypted_key
@@ -199,7 +325,13 @@ class ApiKey(Base):
 class ConversationDocument(Base):
     """Junction table for many-to-many relationship between conversations and documents."""
     __tablename__ = 'conversation_documents'
-    
+    __table_args__ = (
+        # Duplicate attaches are rejected by the database, letting the API
+        # attach with a single INSERT OR IGNORE instead of check-then-insert
+        UniqueConstraint('conversation_id', 'document_id', name='uq_conversation_document'),
+    )
+
+
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
     document_id = Column(Integer, ForeignKey('documents.id'), nullable=False)
@@ -215,6 +347,6 @@ class ConversationDocument(Base):
             'id': self.id,
             'conversation_id': self.conversation_id,
             'document_id': self.document_id,
-            'attached_at': self.attached_at.isoformat() if self.attached_at else None
+            'attached_at': self.attached_at
         }
 
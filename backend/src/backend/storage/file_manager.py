@@ -2,6 +2,7 @@
 
 import os
 import shutil
+from hashlib import sha256
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from ..config import Config
@@ -43,29 +44,38 @@ def save_file(file, user_id, document_id):
         document_id: Document ID for naming
         
     Returns:
-        Tuple of (file_path, filename) if successful, (None, None) otherwise
+        Tuple of (file_path, filename, content_hash) if successful,
+        (None, None, None) otherwise
     """
     if not file or not allowed_file(file.filename):
-        return None, None
-    
+        return None, None, None
+
     # Secure the filename
     original_filename = secure_filename(file.filename)
-    
+
     # Create filename with document ID
     ext = original_filename.rsplit('.', 1)[1].lower()
     new_filename = f"{document_id}.{ext}"
-    
+
     # Get user directory
     user_dir = get_user_upload_dir(user_id)
     file_path = user_dir / new_filename
-    
-    # Save file
+
+    # Stream to disk in fixed-size chunks so memory stays bounded for
+    # large PDFs, hashing the content in the same pass for deduplication
     try:
-        file.save(str(file_path))
-        return str(file_path), original_filename
+        hasher = sha256()
+        with open(file_path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+        return str(file_path), original_filename, hasher.hexdigest()
     except Exception as e:
         print(f"Error saving file: {e}")
-        return None, None
+        return None, None, None
 
 
 def get_file_path(user_id, document_id, extension='pdf'):
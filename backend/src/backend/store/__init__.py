@@ -2,13 +2,17 @@
 
 from .embeddings import (
     get_embedding_model,
+    warm_embedding_model,
+    iter_pdf_pages,
     extract_text_from_pdf,
     process_pdf_to_chunks,
     generate_embeddings,
-    generate_embedding
+    generate_embedding,
+    embedding_cache_info
 )
 from .chroma_client import (
     get_chroma_client,
+    hnsw_metadata,
     create_collection,
     get_collection,
     add_documents_to_collection,
@@ -17,24 +21,36 @@ from .chroma_client import (
 )
 from .search import (
     search_documents,
+    search_documents_batch,
     search_multiple_documents,
+    search_multiple_documents_batch,
+    warm_collections,
+    iter_context_from_results,
     get_context_from_results
 )
 
 __all__ = [
     'get_embedding_model',
+    'warm_embedding_model',
+    'iter_pdf_pages',
     'extract_text_from_pdf',
     'process_pdf_to_chunks',
     'generate_embeddings',
     'generate_embedding',
+    'embedding_cache_info',
     'get_chroma_client',
+    'hnsw_metadata',
     'create_collection',
     'get_collection',
     'add_documents_to_collection',
     'delete_collection',
     'collection_exists',
     'search_documents',
+    'search_documents_batch',
     'search_multiple_documents',
+    'search_multiple_documents_batch',
+    'warm_collections',
+    'iter_context_from_results',
     'get_context_from_results'
 ]
 
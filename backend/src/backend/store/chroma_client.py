@@ -1,5 +1,7 @@
 """ChromaDB client for vector storage."""
 
+import threading
+
 import chromadb
 from chromadb.config import Settings
 from ..config import Config
@@ -7,6 +9,13 @@ from ..config import Config
 # Global ChromaDB client
 _chroma_client = None
 
+# Collection handles keyed by name. Opening a collection walks the
+# persistent store's metadata each time; search hits this cache instead
+# of paying that per query. Misses are not cached so a collection created
+# moments later is still found.
+_collection_cache = {}
+_collection_cache_lock = threading.Lock()
+
 
 def get_chroma_client():
     """Get or initialize the ChromaDB client.
@@ -26,29 +35,50 @@ def get_chroma_client():
     return _chroma_client
 
 
+def hnsw_metadata():
+    """Build the collection metadata carrying the tuned HNSW parameters.
+
+    Returns:
+        Metadata dict to pass when creating a collection
+    """
+    return {
+        # Embeddings are pre-normalized at encode time, so inner product
+        # ranks identically to cosine minus the per-query norm divide
+        "hnsw:space": "ip",
+        "hnsw:M": Config.CHROMA_HNSW_M,
+        "hnsw:construction_ef": Config.CHROMA_HNSW_EF_CONSTRUCTION,
+        "hnsw:search_ef": Config.CHROMA_HNSW_EF_SEARCH
+    }
+
+
 def create_collection(collection_name):
     """Create a new collection in ChromaDB.
-    
+
     Args:
         collection_name: Name for the collection
-        
+
     Returns:
         Collection object
     """
     client = get_chroma_client()
-    
+
     # Delete collection if it already exists
+    with _collection_cache_lock:
+        _collection_cache.pop(collection_name, None)
     try:
         client.delete_collection(name=collection_name)
     except:
         pass
-    
+
     # Create new collection
     collection = client.create_collection(
         name=collection_name,
-        metadata={"hnsw:space": "cosine"}
+        metadata=hnsw_metadata()
     )
-    
+
+    with _collection_cache_lock:
+        _collection_cache[collection_name] = collection
+
     return collection
 
 
@@ -61,41 +91,67 @@ def get_collection(collection_name):
     Returns:
         Collection object or None if not found
     """
+    with _collection_cache_lock:
+        collection = _collection_cache.get(collection_name)
+    if collection is not None:
+        return collection
+
     client = get_chroma_client()
-    
+
     try:
-        return client.get_collection(name=collection_name)
+        collection = client.get_collection(name=collection_name)
     except Exception as e:
         print(f"Error getting collection {collection_name}: {e}")
         return None
 
+    with _collection_cache_lock:
+        _collection_cache[collection_name] = collection
+    return collection
+
+
+# Rows per collection.add call; stays under Chroma's internal SQLite
+# parameter limit so it never re-splits the batch itself
+_MAX_ADD_BATCH = 5000
+
+
+def add_documents_to_collection(collection, texts, page_numbers, start_index,
+                                embeddings, doc_id):
+    """Add a batch of document chunks to a collection.
+
+    Takes the parallel arrays from process_pdf_to_chunks (or a slice of
+    them) and builds ids and metadatas in a single pass.
 
-def add_documents_to_collection(collection, chunks, embeddings, doc_id):
-    """Add document chunks to a collection.
-    
     Args:
         collection: ChromaDB collection object
-        chunks: List of chunk dicts with 'text', 'page_number', 'chunk_index'
-        embeddings: List of embedding vectors
+        texts: List of chunk text strings
+        page_numbers: Page number per chunk, parallel to texts
+        start_index: Chunk index of the first entry in the batch
+        embeddings: List of embedding vectors, parallel to texts
         doc_id: Document ID for metadata
     """
-    ids = [f"doc_{doc_id}_chunk_{chunk['chunk_index']}" for chunk in chunks]
-    documents = [chunk['text'] for chunk in chunks]
-    metadatas = [
-        {
-            'doc_id': str(doc_id),
-            'page_number': chunk['page_number'],
-            'chunk_index': chunk['chunk_index']
-        }
-        for chunk in chunks
-    ]
-    
-    collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        documents=documents,
-        metadatas=metadatas
-    )
+    doc_id_str = str(doc_id)
+    # Chunk indexes are contiguous from start_index, so ids come from the
+    # shared prefix plus a counter — doc_id is formatted once, not per chunk
+    id_base = f"doc_{doc_id}_chunk_"
+    ids = []
+    metadatas = []
+    for offset, page_number in enumerate(page_numbers):
+        chunk_index = start_index + offset
+        ids.append(id_base + str(chunk_index))
+        metadatas.append({
+            'doc_id': doc_id_str,
+            'page_number': page_number,
+            'chunk_index': chunk_index
+        })
+
+    for start in range(0, len(ids), _MAX_ADD_BATCH):
+        end = start + _MAX_ADD_BATCH
+        collection.add(
+            ids=ids[start:end],
+            embeddings=embeddings[start:end],
+            documents=texts[start:end],
+            metadatas=metadatas[start:end]
+        )
 
 
 def delete_collection(collection_name):
@@ -108,7 +164,10 @@ def delete_collection(collection_name):
         True if deleted successfully, False otherwise
     """
     client = get_chroma_client()
-    
+
+    with _collection_cache_lock:
+        _collection_cache.pop(collection_name, None)
+
     try:
         client.delete_collection(name=collection_name)
         return True
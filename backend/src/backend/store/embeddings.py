@@ -1,63 +1,105 @@
 """PDF processing and embedding generation."""
 
+import bisect
 import re
+import threading
+from functools import lru_cache
 from pypdf import PdfReader
 from sentence_transformers import SentenceTransformer
 from ..config import Config
 
 # Global embedding model - loaded once
 _embedding_model = None
+_embedding_model_lock = threading.Lock()
 
 
 def get_embedding_model():
     """Get or initialize the embedding model.
-    
+
     Returns:
         SentenceTransformer model
     """
     global _embedding_model
     if _embedding_model is None:
-        _embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = SentenceTransformer(
+                    Config.EMBEDDING_MODEL,
+                    backend=Config.EMBEDDING_BACKEND,
+                    device=Config.EMBEDDING_DEVICE or None
+                )
     return _embedding_model
 
 
-def extract_text_from_pdf(file_path):
-    """Extract text from a PDF file.
-    
+def warm_embedding_model():
+    """Load the embedding model and prime it off the request path.
+
+    The first encode per process pays the multi-second weight load; a
+    daemon thread started from create_app moves that cost to startup so
+    the first user's first message doesn't wait on it.
+    """
+    def _warm():
+        try:
+            get_embedding_model().encode(["warmup"], show_progress_bar=False)
+        except Exception as e:
+            print(f"Error warming embedding model: {e}")
+
+    threading.Thread(target=_warm, name='embedding-warmup', daemon=True).start()
+
+
+def iter_pdf_pages(file_path):
+    """Iterate over the pages of a PDF file lazily.
+
+    Yielding page by page keeps peak memory at one page's text plus the
+    accumulated chunks, instead of holding every page of the document.
+
     Args:
         file_path: Path to the PDF file
-        
-    Returns:
-        List of tuples (page_number, text) for each page
+
+    Yields:
+        Tuples of (page_number, text) for each non-empty page
     """
     try:
         reader = PdfReader(file_path)
-        pages = []
-        
         for i, page in enumerate(reader.pages):
             text = page.extract_text()
             if text.strip():  # Only include non-empty pages
-                pages.append((i + 1, text))
-        
-        return pages
+                yield (i + 1, text)
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        return []
+
+
+def extract_text_from_pdf(file_path):
+    """Extract text from a PDF file.
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        List of tuples (page_number, text) for each page
+    """
+    return list(iter_pdf_pages(file_path))
+
+
+# Compiled once at import; chunking calls clean_text per page, and the
+# stdlib re cache is small enough to thrash under load
+_WS_RE = re.compile(r'\s+')
+_STRIP_RE = re.compile(r'[^\w\s\.,!?;:\-\(\)]')
 
 
 def clean_text(text):
     """Clean and normalize text.
-    
+
     Args:
         text: Raw text string
-        
+
     Returns:
         Cleaned text string
     """
     # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     # Remove special characters but keep basic punctuation
-    text = re.sub(r'[^\w\s\.,!?;:\-\(\)]', '', text)
+    text = _STRIP_RE.sub('', text)
     return text.strip()
 
 
@@ -76,79 +118,129 @@ def chunk_text(text, chunk_size=None, overlap=None):
         chunk_size = Config.CHUNK_SIZE
     if overlap is None:
         overlap = Config.CHUNK_OVERLAP
-    
-    # Clean the text first
+
+    # Clean the text first; whitespace is now single spaces, so word
+    # offsets into the cleaned string are exact
     text = clean_text(text)
-    
-    # Split into words for better chunking
-    words = text.split()
+    if not text:
+        return []
+
+    words = text.split(' ')
+
+    # Character offset of each word start, built in one pass. Chunks are
+    # then native slices of the cleaned text found by binary search —
+    # windows land on word boundaries at the target size, with no
+    # per-chunk join and no characters-per-word guessing.
+    starts = []
+    pos = 0
+    for word in words:
+        starts.append(pos)
+        pos += len(word) + 1
+
     chunks = []
-    
-    # Estimate characters per word (average ~5)
-    words_per_chunk = chunk_size // 5
-    words_overlap = overlap // 5
-    
-    for i in range(0, len(words), words_per_chunk - words_overlap):
-        chunk_words = words[i:i + words_per_chunk]
-        if chunk_words:
-            chunks.append(' '.join(chunk_words))
-        
-        # Break if we've processed all words
-        if i + words_per_chunk >= len(words):
+    n = len(words)
+    i = 0
+    while i < n:
+        start_char = starts[i]
+        # First word starting beyond the window; always take at least one
+        j = bisect.bisect_right(starts, start_char + chunk_size)
+        if j <= i:
+            j = i + 1
+        end_char = starts[j] - 1 if j < n else len(text)
+        chunks.append(text[start_char:end_char])
+
+        if j >= n:
             break
-    
+
+        # Step the next window back ~overlap characters, keeping progress
+        next_i = bisect.bisect_left(starts, end_char - overlap)
+        i = max(next_i, i + 1)
+
     return chunks
 
 
 def process_pdf_to_chunks(file_path):
-    """Process a PDF file into text chunks with metadata.
-    
+    """Process a PDF file into parallel chunk arrays.
+
+    Structure-of-arrays instead of one dict per chunk: the ingestion
+    pipeline batch-slices these lists directly, with no per-chunk dict
+    allocations and no re-walking during Chroma formatting.
+
     Args:
         file_path: Path to the PDF file
-        
+
     Returns:
-        List of dicts with 'text', 'page_number', and 'chunk_index'
+        Dict with 'texts' and 'page_numbers' lists; a chunk's index is
+        its position in the lists
     """
-    pages = extract_text_from_pdf(file_path)
-    all_chunks = []
-    chunk_index = 0
-    
-    for page_number, page_text in pages:
-        chunks = chunk_text(page_text)
-        
-        for chunk in chunks:
-            all_chunks.append({
-                'text': chunk,
-                'page_number': page_number,
-                'chunk_index': chunk_index
-            })
-            chunk_index += 1
-    
-    return all_chunks
+    texts = []
+    page_numbers = []
 
+    # Consume the pages lazily; each page's text is released as soon as
+    # it has been chunked
+    for page_number, page_text in iter_pdf_pages(file_path):
+        for chunk in chunk_text(page_text):
+            texts.append(chunk)
+            page_numbers.append(page_number)
 
-def generate_embeddings(texts):
+    return {'texts': texts, 'page_numbers': page_numbers}
+
+
+def generate_embeddings(texts, batch_size=64):
     """Generate embeddings for a list of texts.
-    
+
+    Embeddings are L2-normalized at encode time so collections indexed
+    with inner-product space get cosine-equivalent ranking without a
+    per-query norm divide.
+
     Args:
         texts: List of text strings
-        
+        batch_size: Texts encoded per forward pass (default: 64)
+
     Returns:
-        List of embedding vectors
+        numpy array of embedding vectors, one row per text
     """
     model = get_embedding_model()
-    embeddings = model.encode(texts, show_progress_bar=False)
-    return embeddings.tolist()
+    # Returned as numpy — Chroma accepts arrays directly, so there is no
+    # point materializing a list of Python floats per vector
+    return model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        precision=Config.EMBEDDING_PRECISION,
+        show_progress_bar=False
+    )
+
+
+# Single-text embeddings are almost always queries, and the same query
+# repeats across the collections of one search and across retries, so a
+# small LRU turns the repeats into dict hits instead of forward passes.
+# The model is a process-level singleton fixed by config, so the text
+# alone is a sufficient key. Callers treat the returned array as
+# read-only, which makes sharing it across hits safe.
+@lru_cache(maxsize=2048)
+def _cached_embedding(text):
+    return generate_embeddings([text])[0]
 
 
 def generate_embedding(text):
-    """Generate embedding for a single text.
-    
+    """Generate embedding for a single text, with an LRU cache.
+
     Args:
         text: Text string
-        
+
     Returns:
-        Embedding vector as list
+        Embedding vector as a numpy array
     """
-    return generate_embeddings([text])[0]
+    return _cached_embedding(text)
+
+
+def embedding_cache_info():
+    """Get hit/miss statistics for the single-text embedding cache.
+
+    Returns:
+        functools CacheInfo namedtuple
+    """
+    return _cached_embedding.cache_info()
 
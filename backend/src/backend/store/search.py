@@ -1,28 +1,62 @@
 """Vector search functionality."""
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
 from .chroma_client import get_collection
-from .embeddings import generate_embedding
+from .embeddings import generate_embedding, generate_embeddings
+
+# Fan-out pool for multi-collection searches. Collection queries are
+# I/O-bound (Chroma's sqlite reads and mmap'd index pages), so running
+# them concurrently drops wall time from the sum of the per-collection
+# latencies to roughly the slowest one. Shared at module level so the
+# chat hot path never pays thread spawn per message.
+_QUERY_POOL = ThreadPoolExecutor(max_workers=16)
+
+
+def _format_result_row(documents, metadatas, distances):
+    """Format one query's parallel Chroma result lists into result dicts.
+
+    The hot loop is a single zip comprehension: the per-query lists are
+    bound once, so each row costs one tuple unpack and one dict build
+    instead of three indexed lookups back into the results payload.
+
+    Args:
+        documents: Chunk texts for one query
+        metadatas: Metadata dicts, parallel to documents
+        distances: Distances, parallel to documents
+
+    Returns:
+        List of result dicts with 'text', 'metadata', 'distance'
+    """
+    return [
+        {'text': text, 'metadata': metadata, 'distance': distance}
+        for text, metadata, distance in zip(documents, metadatas, distances)
+    ]
 
 
-def search_documents(collection_name, query_text, n_results=5):
+def search_documents(collection_name, query_text, n_results=5, query_embedding=None):
     """Search for relevant document chunks using cosine similarity.
-    
+
     Args:
         collection_name: Name of the ChromaDB collection
         query_text: Query text to search for
         n_results: Number of results to return (default: 5)
-        
+        query_embedding: Precomputed embedding for query_text; pass it when
+            searching several collections to embed the query only once
+
     Returns:
         List of result dicts with 'text', 'metadata', 'distance'
     """
     collection = get_collection(collection_name)
-    
+
     if not collection:
         return []
-    
-    # Generate embedding for query
-    query_embedding = generate_embedding(query_text)
-    
+
+    # Generate embedding for query unless the caller already has one
+    if query_embedding is None:
+        query_embedding = generate_embedding(query_text)
+
     # Perform search
     results = collection.query(
         query_embeddings=[query_embedding],
@@ -31,80 +65,227 @@ def search_documents(collection_name, query_text, n_results=5):
     )
     
     # Format results
-    formatted_results = []
-    if results and results['documents'] and results['documents'][0]:
-        for i in range(len(results['documents'][0])):
-            formatted_results.append({
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]
-            })
-    
-    return formatted_results
+    if not results or not results['documents'] or not results['documents'][0]:
+        return []
+
+    return _format_result_row(
+        results['documents'][0], results['metadatas'][0], results['distances'][0]
+    )
+
+
+def search_documents_batch(collection_name, query_texts, n_results=5,
+                           query_embeddings=None, where=None):
+    """Search one collection with several queries in a single call.
+
+    Chroma scores every query embedding in one round trip, so tokenization
+    and ANN setup are amortized across the batch instead of paid per query.
+
+    Args:
+        collection_name: Name of the ChromaDB collection
+        query_texts: List of query strings
+        n_results: Number of results to return per query (default: 5)
+        query_embeddings: Precomputed embeddings for query_texts (optional)
+        where: Optional Chroma metadata filter for the search
+
+    Returns:
+        List with one result list (as in search_documents) per query
+    """
+    collection = get_collection(collection_name)
+
+    if not collection:
+        return [[] for _ in query_texts]
+
+    if query_embeddings is None:
+        query_embeddings = generate_embeddings(query_texts)
+
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=n_results,
+        where=where,
+        include=['documents', 'metadatas', 'distances']
+    )
+
+    if not results or not results['documents']:
+        return [[] for _ in query_texts]
+
+    return [
+        _format_result_row(documents, metadatas, distances)
+        for documents, metadatas, distances in zip(
+            results['documents'], results['metadatas'], results['distances']
+        )
+    ]
+
+
+# Over-fetch multiplier for filtered searches. A metadata filter prunes
+# neighbors during HNSW traversal, so a restrictive filter can return
+# fewer than n_results; asking for more and truncating restores recall.
+_FILTER_OVERFETCH = 3
+
+
+def _doc_id_filter(doc_ids):
+    """Build the Chroma where-clause restricting a search to documents.
+
+    Args:
+        doc_ids: Document IDs to restrict to
+
+    Returns:
+        Chroma metadata filter dict, or None for an empty id list
+    """
+    ids = [str(doc_id) for doc_id in doc_ids]
+    if not ids:
+        return None
+    if len(ids) == 1:
+        return {'doc_id': ids[0]}
+    return {'doc_id': {'$in': ids}}
 
 
-def search_multiple_documents(collection_names, query_text, n_results_per_doc=5):
+def search_multiple_documents(collection_names, query_text, n_results_per_doc=5,
+                              doc_ids=None):
     """Search across multiple document collections.
-    
+
     Args:
         collection_names: List of collection names to search
         query_text: Query text to search for
         n_results_per_doc: Number of results to return per document (default: 5)
-        
+        doc_ids: Optional document IDs to restrict the search to
+
     Returns:
         Dict mapping collection_name to list of results
     """
-    all_results = {}
-    
-    for collection_name in collection_names:
-        results = search_documents(collection_name, query_text, n_results_per_doc)
-        if results:
-            all_results[collection_name] = results
-    
+    return search_multiple_documents_batch(
+        collection_names, [query_text], n_results_per_doc, doc_ids=doc_ids
+    )[0]
+
+
+def search_multiple_documents_batch(collection_names, query_texts,
+                                    n_results_per_doc=5, doc_ids=None):
+    """Search multiple collections with several queries at once.
+
+    The queries are embedded in one forward pass and each collection is
+    queried once for the whole batch — the shape query expansion needs
+    without adding calls to the chat hot path. When doc_ids is given the
+    search is restricted by metadata filter and deliberately over-fetches
+    before truncating, since filtering inside HNSW traversal can
+    otherwise come back short.
+
+    Args:
+        collection_names: List of collection names to search
+        query_texts: List of query strings
+        n_results_per_doc: Number of results to return per document (default: 5)
+        doc_ids: Optional document IDs to restrict the search to
+
+    Returns:
+        List with one dict (collection_name -> results) per query
+    """
+    # Consolidated per-user collections make attached documents share a
+    # name; dedupe so each collection is queried once
+    collection_names = list(dict.fromkeys(collection_names))
+
+    where = _doc_id_filter(doc_ids) if doc_ids is not None else None
+    fetch_n = n_results_per_doc * _FILTER_OVERFETCH if where else n_results_per_doc
+
+    # Embed once for every collection, then fan the collection queries
+    # out on the shared pool; a single collection skips the pool hop
+    query_embeddings = generate_embeddings(query_texts)
+
+    def query_one(collection_name):
+        per_query = search_documents_batch(
+            collection_name, query_texts, fetch_n,
+            query_embeddings=query_embeddings, where=where
+        )
+        if fetch_n != n_results_per_doc:
+            per_query = [results[:n_results_per_doc] for results in per_query]
+        return per_query
+
+    if len(collection_names) > 1:
+        batches = _QUERY_POOL.map(query_one, collection_names)
+    else:
+        batches = map(query_one, collection_names)
+
+    all_results = [{} for _ in query_texts]
+    for collection_name, per_query in zip(collection_names, batches):
+        for q, results in enumerate(per_query):
+            if results:
+                all_results[q][collection_name] = results
+
     return all_results
 
 
+def warm_collections(collection_names):
+    """Page collections into memory ahead of their first real query.
+
+    A cold collection pays disk reads for its sqlite pages and HNSW
+    graph on the first search; a throwaway one-result query forces that
+    load while the user is still typing. Runs entirely on the query
+    pool, so callers return immediately.
+
+    Args:
+        collection_names: Iterable of collection names to warm
+    """
+    def warm_one(collection_name):
+        collection = get_collection(collection_name)
+        if collection is None:
+            return
+        try:
+            collection.query(
+                query_embeddings=[generate_embedding('warmup')],
+                n_results=1
+            )
+        except Exception:
+            # Warming is best-effort; the real query reports real errors
+            pass
+
+    for collection_name in set(collection_names):
+        _QUERY_POOL.submit(warm_one, collection_name)
+
+
+def iter_context_from_results(results, max_chunks=10):
+    """Yield formatted context parts for search results, chunk by chunk.
+
+    The lazy form lets callers stream parts straight into a join or a
+    buffer without holding both a parts list and the assembled string.
+
+    Args:
+        results: Search results from search_documents or search_multiple_documents
+        max_chunks: Maximum number of chunks to include (default: 10)
+
+    Yields:
+        One formatted context string per result chunk
+    """
+    # Flatten the per-collection dict shape into one result stream;
+    # islice bounds it at max_chunks without counter bookkeeping
+    if isinstance(results, dict):
+        iterable = chain.from_iterable(results.values())
+    elif isinstance(results, list):
+        iterable = results
+    else:
+        return
+
+    # Neighboring chunks usually come from the same document and page,
+    # so the bracket header is memoized per (doc_id, page) instead of
+    # re-interpolated for every chunk
+    headers = {}
+
+    for result in islice(iterable, max_chunks):
+        metadata = result['metadata']
+        key = (metadata.get('doc_id', 'unknown'),
+               metadata.get('page_number', 'unknown'))
+        header = headers.get(key)
+        if header is None:
+            header = f"[Document: {key[0]}, Page {key[1]}]\n"
+            headers[key] = header
+        yield header + result['text']
+
+
 def get_context_from_results(results, max_chunks=10):
     """Convert search results into context text for LLM.
-    
+
     Args:
         results: Search results from search_documents or search_multiple_documents
         max_chunks: Maximum number of chunks to include (default: 10)
-        
+
     Returns:
         Formatted context string
     """
-    context_parts = []
-    chunk_count = 0
-    
-    # Handle results from search_multiple_documents (dict)
-    if isinstance(results, dict):
-        for collection_name, collection_results in results.items():
-            for result in collection_results:
-                if chunk_count >= max_chunks:
-                    break
-                
-                context_parts.append(
-                    f"[Document: {result['metadata'].get('doc_id', 'unknown')}, "
-                    f"Page {result['metadata'].get('page_number', 'unknown')}]\n"
-                    f"{result['text']}"
-                )
-                chunk_count += 1
-            
-            if chunk_count >= max_chunks:
-                break
-    
-    # Handle results from search_documents (list)
-    elif isinstance(results, list):
-        for result in results[:max_chunks]:
-            context_parts.append(
-                f"[Document: {result['metadata'].get('doc_id', 'unknown')}, "
-                f"Page {result['metadata'].get('page_number', 'unknown')}]\n"
-                f"{result['text']}"
-            )
-    
-    if not context_parts:
-        return ""
-    
-    return "\n\n---\n\n".join(context_parts)
+    return "\n\n---\n\n".join(iter_context_from_results(results, max_chunks))
 
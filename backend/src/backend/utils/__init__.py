@@ -1,23 +1,29 @@
 """Utilities module."""
 
 from .llm_providers import (
+    MODEL_TO_PROVIDER,
+    MODEL_PROVIDER_CLASS_MAP,
     LLMProvider,
     OpenAIProvider,
     AnthropicProvider,
     GoogleProvider,
     GrokProvider,
     get_provider,
+    get_provider_for_key,
     get_provider_from_model,
     stream_llm_response
 )
 
 __all__ = [
+    'MODEL_TO_PROVIDER',
+    'MODEL_PROVIDER_CLASS_MAP',
     'LLMProvider',
     'OpenAIProvider',
     'AnthropicProvider',
     'GoogleProvider',
     'GrokProvider',
     'get_provider',
+    'get_provider_for_key',
     'get_provider_from_model',
     'stream_llm_response'
 ]
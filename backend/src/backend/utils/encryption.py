@@ -1,14 +1,19 @@
 """Encryption utilities for sensitive data like API keys."""
 
 import base64
+from functools import lru_cache
 from hashlib import sha256
 from cryptography.fernet import Fernet
 from ..config import Config
 
 
+# Cached: the key is derived from SECRET_KEY, which is fixed for the
+# process lifetime, and decrypt runs on every LLM call — no reason to
+# redo the sha256 + base64 + Fernet key validation each time
+@lru_cache(maxsize=1)
 def get_encryption_key():
     """Get or generate encryption key for API keys.
-    
+
     Returns:
         Fernet encryption key
     """
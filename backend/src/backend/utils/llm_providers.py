@@ -1,11 +1,25 @@
 """LLM provider integrations with streaming support."""
 
+import re
+import threading
 from abc import ABC, abstractmethod
+from hashlib import sha256
+
+import httpx
 import openai
 from anthropic import Anthropic
 import google.generativeai as genai
 from ..config import Config
 
+# One transport shared by every OpenAI-compatible client (OpenAI and
+# Grok differ only in base_url and key). httpx pools connections per
+# origin, so the providers coexist on it while sharing a TLS context
+# and socket budget instead of each holding their own pool.
+_SHARED_HTTP_CLIENT = httpx.Client(
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+)
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -29,7 +43,10 @@ class OpenAIProvider(LLMProvider):
     
     def __init__(self, api_key=None):
         self.api_key = api_key or Config.OPENAI_API_KEY
-        self.client = openai.OpenAI(api_key=self.api_key)
+        self.client = openai.OpenAI(
+            api_key=self.api_key,
+            http_client=_SHARED_HTTP_CLIENT
+        )
     
     def stream_chat(self, messages, model):
         """Stream OpenAI chat completion."""
@@ -39,11 +56,14 @@ class OpenAIProvider(LLMProvider):
                 messages=messages,
                 stream=True
             )
-            
+
+            # One attribute walk per token; walrus-bind the content so
+            # the truthiness check and the yield share the lookup
             for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-                    
+                choices = chunk.choices
+                if choices and (content := choices[0].delta.content):
+                    yield content
+
         except Exception as e:
             yield f"Error with OpenAI: {str(e)}"
 
@@ -58,20 +78,16 @@ class AnthropicProvider(LLMProvider):
     def stream_chat(self, messages, model):
         """Stream Anthropic chat completion."""
         try:
-            # Convert messages to Anthropic format
-            # Anthropic requires system messages to be separate
-            system_message = None
-            anthropic_messages = []
-            
-            for msg in messages:
-                if msg['role'] == 'system':
-                    system_message = msg['content']
-                else:
-                    anthropic_messages.append({
-                        'role': msg['role'],
-                        'content': msg['content']
-                    })
-            
+            # Anthropic requires system messages to be separate. The SDK
+            # accepts the caller's dicts as-is, so the non-system messages
+            # are filtered without rebuilding a dict per turn.
+            system_message = next(
+                (msg['content'] for msg in messages if msg['role'] == 'system'),
+                None
+            )
+            anthropic_messages = [msg for msg in messages if msg['role'] != 'system']
+
+
             kwargs = {
                 'model': model,
                 'messages': anthropic_messages,
@@ -80,7 +96,13 @@ class AnthropicProvider(LLMProvider):
             }
             
             if system_message:
-                kwargs['system'] = system_message
+                # cache_control lets Anthropic reuse the tokenized system
+                # prompt across turns, cutting time-to-first-token and cost
+                kwargs['system'] = [{
+                    'type': 'text',
+                    'text': system_message,
+                    'cache_control': {'type': 'ephemeral'}
+                }]
             
             with self.client.messages.stream(**kwargs) as stream:
                 for text in stream.text_stream:
@@ -90,38 +112,85 @@ class AnthropicProvider(LLMProvider):
             yield f"Error with Anthropic: {str(e)}"
 
 
+# genai.configure sets a module-global credential, so it must be
+# re-applied immediately before every dispatch and the two must not be
+# interleaved across threads — otherwise a cached provider streams on
+# whichever key was configured last, i.e. another user's key
+_genai_lock = threading.Lock()
+
+
 class GoogleProvider(LLMProvider):
     """Google Gemini API provider."""
-    
+
     def __init__(self, api_key=None):
         self.api_key = api_key or Config.GOOGLE_API_KEY
-        genai.configure(api_key=self.api_key)
-    
+        # GenerativeModel handles keyed by (model, system prompt);
+        # constructing one per stream_chat call rebuilds the underlying
+        # gRPC channel each turn. The system prompts are a small fixed
+        # set, so the cache stays tiny.
+        self._models = {}
+
+    def _get_model(self, model, system_instruction=None):
+        """Get a cached GenerativeModel handle for a model name.
+
+        Must be called with _genai_lock held and this instance's key
+        configured: a handle binds the active global credential at its
+        first request and keeps that client afterwards. Because the
+        provider caches are keyed by api_key and every first use happens
+        under the lock, a cached handle can only ever have bound this
+        instance's own key.
+        """
+        cache_key = (model, system_instruction)
+        gemini_model = self._models.get(cache_key)
+        if gemini_model is None:
+            gemini_model = genai.GenerativeModel(
+                model, system_instruction=system_instruction
+            )
+            self._models[cache_key] = gemini_model
+        return gemini_model
+
     def stream_chat(self, messages, model):
         """Stream Google Gemini chat completion."""
         try:
-            # Convert messages to Gemini format
-            gemini_model = genai.GenerativeModel(model)
-            
-            # Gemini requires a specific format
-            # Combine system and user messages into the prompt
-            prompt_parts = []
+            # Use the native chat API instead of flattening history into
+            # one prompt string: structured turns preserve the message
+            # boundaries Gemini's implicit context cache keys on, so
+            # follow-up turns skip re-prefilling the shared history. The
+            # system message rides on the model as system_instruction.
+            system_message = next(
+                (msg['content'] for msg in messages if msg['role'] == 'system'),
+                None
+            )
+
+            # Gemini rejects consecutive same-role turns, and the RAG
+            # path sends retrieved context and the query as two user
+            # messages — adjacent same-role contents are merged into one
+            # multi-part turn
+            turns = []
             for msg in messages:
                 if msg['role'] == 'system':
-                    prompt_parts.append(f"System: {msg['content']}")
-                elif msg['role'] == 'user':
-                    prompt_parts.append(f"User: {msg['content']}")
-                elif msg['role'] == 'assistant':
-                    prompt_parts.append(f"Assistant: {msg['content']}")
-            
-            prompt = "\n\n".join(prompt_parts)
-            
-            response = gemini_model.generate_content(prompt, stream=True)
-            
+                    continue
+                role = 'user' if msg['role'] == 'user' else 'model'
+                if turns and turns[-1]['role'] == role:
+                    turns[-1]['parts'].append(msg['content'])
+                else:
+                    turns.append({'role': role, 'parts': [msg['content']]})
+
+            # Configure this instance's key and dispatch under the lock:
+            # the SDK resolves its client from the global credential at
+            # the send_message call, so nothing else may reconfigure
+            # between here and there. The in-flight stream keeps its
+            # client, so iteration happens outside the lock.
+            with _genai_lock:
+                genai.configure(api_key=self.api_key)
+                gemini_model = self._get_model(model, system_message)
+                chat = gemini_model.start_chat(history=turns[:-1])
+                response = chat.send_message(turns[-1]['parts'], stream=True)
+
             for chunk in response:
                 if chunk.text:
                     yield chunk.text
-                    
+
         except Exception as e:
             yield f"Error with Google: {str(e)}"
 
@@ -134,7 +203,8 @@ class GrokProvider(LLMProvider):
         # Grok uses OpenAI-compatible API
         self.client = openai.OpenAI(
             api_key=self.api_key,
-            base_url="https://api.x.ai/v1"
+            base_url="https://api.x.ai/v1",
+            http_client=_SHARED_HTTP_CLIENT
         )
     
     def stream_chat(self, messages, model):
@@ -145,11 +215,12 @@ class GrokProvider(LLMProvider):
                 messages=messages,
                 stream=True
             )
-            
+
             for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-                    
+                choices = chunk.choices
+                if choices and (content := choices[0].delta.content):
+                    yield content
+
         except Exception as e:
             yield f"Error with Grok: {str(e)}"
 
@@ -163,46 +234,154 @@ PROVIDERS = {
 }
 
 
+# Default-key provider instances, one per provider name. The keys come
+# from Config and never change within a process, so these can live for
+# its lifetime and keep their HTTP connection pools warm. This is safe
+# for Google only because GoogleProvider re-applies its own key under
+# _genai_lock on every dispatch — the global genai credential may have
+# been switched by any per-user instance in between.
+_default_providers = {}
+_default_providers_lock = threading.Lock()
+
+
 def get_provider(provider_name):
-    """Get an LLM provider by name.
-    
+    """Get an LLM provider by name, using the configured default API key.
+
+    Instances are cached per provider so repeated calls reuse the same
+    HTTP client and its kept-alive connections.
+
     Args:
         provider_name: Name of the provider ('openai', 'anthropic', 'google', 'grok')
-        
+
     Returns:
         LLMProvider instance
-        
+
+    Raises:
+        ValueError if provider name is not recognized
+    """
+    name = provider_name.lower()
+    provider = _default_providers.get(name)
+    if provider is not None:
+        return provider
+
+    provider_class = PROVIDERS.get(name)
+    if not provider_class:
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+    with _default_providers_lock:
+        return _default_providers.setdefault(name, provider_class())
+
+
+# Provider instances cached per (provider, api-key hash). Instantiating a
+# provider builds a fresh HTTP client, so without the cache every chat turn
+# pays a new TCP+TLS handshake instead of reusing a kept-alive connection.
+# Keys are hashed so plaintext API keys are not held as dict keys.
+_PROVIDER_CACHE_MAX = 256
+_provider_cache = {}
+_provider_cache_lock = threading.Lock()
+
+
+def get_provider_for_key(provider_name, api_key):
+    """Get a cached provider instance for a specific API key.
+
+    Args:
+        provider_name: Name of the provider ('openai', 'anthropic', 'google', 'grok')
+        api_key: API key the provider should authenticate with
+
+    Returns:
+        LLMProvider instance, reused across calls with the same key
+
     Raises:
         ValueError if provider name is not recognized
     """
     provider_class = PROVIDERS.get(provider_name.lower())
     if not provider_class:
         raise ValueError(f"Unknown provider: {provider_name}")
-    return provider_class()
+
+    cache_key = (provider_name.lower(), sha256(api_key.encode('utf-8')).hexdigest())
+
+    with _provider_cache_lock:
+        provider = _provider_cache.get(cache_key)
+    if provider is not None:
+        return provider
+
+    # Construct outside the lock: building a client sets up TLS contexts
+    # and must not serialize every other user's chat turn. A racing
+    # duplicate is harmless — one instance wins the cache below.
+    provider = provider_class(api_key=api_key)
+
+    with _provider_cache_lock:
+        existing = _provider_cache.get(cache_key)
+        if existing is not None:
+            return existing
+        if len(_provider_cache) >= _PROVIDER_CACHE_MAX:
+            _provider_cache.pop(next(iter(_provider_cache)))
+        _provider_cache[cache_key] = provider
+        return provider
+
+
+# Exact model names resolve with one dict hit on the per-message path; the
+# substring walk in get_provider_from_model only runs for models not seen
+# before, and its result is memoized here
+MODEL_TO_PROVIDER = {
+    'gpt-4': 'openai',
+    'gpt-4o': 'openai',
+    'gpt-4o-mini': 'openai',
+    'o1': 'openai',
+    'o1-mini': 'openai',
+    'claude-3-opus': 'anthropic',
+    'claude-3-sonnet': 'anthropic',
+    'claude-3-haiku': 'anthropic',
+    'gemini-pro': 'google',
+    'gemini-1.5-pro': 'google',
+    'grok-beta': 'grok',
+}
+
+
+# Provider classes resolvable straight from a model name — one dict hit
+# replaces the name lookup followed by a registry lookup, and lets callers
+# validate a model before doing any DB work
+MODEL_PROVIDER_CLASS_MAP = {
+    model: PROVIDERS[name] for model, name in MODEL_TO_PROVIDER.items()
+}
+
+
+# One compiled alternation replaces four sequential substring scans on
+# the cold path; the matched group index selects the provider
+_MODEL_PROVIDER_RE = re.compile(r'(gpt|o1)|(claude)|(gemini)|(grok)', re.IGNORECASE)
+_MODEL_PROVIDER_GROUPS = ('openai', 'anthropic', 'google', 'grok')
+
+# Model names arrive from the client, so the memo dicts are capped —
+# real deployments see a handful of names, and past the cap the scan
+# just runs per call instead of letting spam grow the dicts unbounded
+_MODEL_MEMO_MAX = 256
 
 
 def get_provider_from_model(model):
     """Detect provider from model name.
-    
+
     Args:
         model: Model name string (e.g., 'gpt-4', 'claude-3-opus')
-        
+
     Returns:
         Provider name string
     """
-    model_lower = model.lower()
-    
-    if 'gpt' in model_lower or 'o1' in model_lower:
-        return 'openai'
-    elif 'claude' in model_lower:
-        return 'anthropic'
-    elif 'gemini' in model_lower:
-        return 'google'
-    elif 'grok' in model_lower:
-        return 'grok'
+    provider = MODEL_TO_PROVIDER.get(model)
+    if provider is not None:
+        return provider
+
+    match = _MODEL_PROVIDER_RE.search(model)
+    if match:
+        provider = _MODEL_PROVIDER_GROUPS[match.lastindex - 1]
     else:
         # Default to OpenAI
-        return 'openai'
+        provider = 'openai'
+
+    # Memoize so the scan runs once per distinct model name
+    if len(MODEL_TO_PROVIDER) < _MODEL_MEMO_MAX:
+        MODEL_TO_PROVIDER[model] = provider
+        MODEL_PROVIDER_CLASS_MAP[model] = PROVIDERS[provider]
+    return provider
 
 
 def stream_llm_response(messages, model):
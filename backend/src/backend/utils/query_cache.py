@@ -0,0 +1,71 @@
+"""Thread-safe LRU+TTL cache for RAG search results."""
+
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha1
+
+
+class QueryCache:
+    """LRU cache with per-entry TTL and per-user invalidation.
+
+    Repeat and retried chat queries hit the cache instead of paying the
+    embedding and ANN-search cost again. Entries remember which user they
+    belong to so document uploads/deletes can drop just that user's
+    results.
+    """
+
+    def __init__(self, max_size=2000, ttl_seconds=300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (user_id, value, expires_at), in LRU order
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(user_id, query, scope):
+        """Build a stable cache key from the query parameters.
+
+        Args:
+            user_id: User the query belongs to
+            query: Query text; normalized so trivial rephrasings still hit
+            scope: String folding in anything else that affects results
+                (result counts, attached document ids, ...)
+
+        Returns:
+            Hex digest usable as a cache key
+        """
+        normalized = query.strip().lower()
+        return sha1(f"{user_id}|{scope}|{normalized}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached value for key, or None on miss/expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            user_id, value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, user_id, value):
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            elif len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+
+            self._entries[key] = (user_id, value, time.monotonic() + self.ttl_seconds)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached entry belonging to a user."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[0] == user_id]
+            for key in stale:
+                del self._entries[key]